@@ -1,4 +1,4 @@
-from django.contrib.gis.db.models import Manager, PointField
+from django.contrib.gis.db.models import Manager, MultiPolygonField, PointField
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
@@ -12,11 +12,20 @@ from decimal import Decimal as D
 
 from server.apps.user.models import City
 from server.apps.vendor.models import Vendor
+from stores.cache import get_store_versions, store_cache_key
 from stores.managers import StoreManager
-from stores.utils import get_geodetic_srid
+from stores.schedule import UTCSchedule, WeeklySchedule
+from stores.utils import (
+    get_geodetic_srid, get_status_cache_max_timeout, get_status_cache_timeout, validate_time_zone)
 from django.utils import timezone
 from datetime import datetime, time, timedelta
-from django.utils.timezone import localtime
+from django.utils.timezone import get_default_timezone, localtime
+import math
+import zoneinfo
+
+# Location given to stores that haven't been placed yet
+DEFAULT_LOCATION = Point(46.6753, 24.7136)
+
 
 # Re-use Oscar's address model
 class StoreAddress(AbstractAddress):
@@ -86,11 +95,25 @@ class Store(models.Model):
     location = PointField(
         _("Location"),
         srid=get_geodetic_srid(),
-        default=Point(46.6753, 24.7136)
+        default=DEFAULT_LOCATION
     )
     is_main = models.BooleanField(default=False)
     city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True)
     state = models.CharField(max_length=100, null=True, blank=True)
+    time_zone = models.CharField(
+        _("Time zone"),
+        max_length=63,
+        blank=True,
+        default='',
+        validators=[validate_time_zone],
+        help_text=_("Time zone of the opening hours, e.g. Asia/Riyadh. "
+                    "Leave empty to use the site's time zone."))
+    service_area = MultiPolygonField(
+        _("Service area"),
+        srid=get_geodetic_srid(),
+        null=True,
+        blank=True,
+        help_text=_("Area the store delivers to or serves"))
 
 
     group = models.ForeignKey(
@@ -128,6 +151,10 @@ class Store(models.Model):
     )
     objects = StoreManager()
 
+    # Fields the store directory caches, such as map clusters and markers,
+    # depend on.  Translations of the name are included too.
+    DIRECTORY_FIELDS = ('name', 'slug', 'location', 'is_active', 'group')
+
     class Meta:
         abstract = True
         ordering = ('name',)
@@ -166,11 +193,37 @@ class Store(models.Model):
                     )
         if not self.slug:
             self.slug = slugify(self.name)
-        if self.pk:
-            cache_key = f'store_status_{self.pk}'
-            cache.delete(cache_key)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the map tiles of a store's previous location can be
+        # invalidated when it moves
+        instance._loaded_location = instance.__dict__.get('location')
+        instance._loaded_directory_values = instance.get_directory_values()
+        return instance
+
+    def get_directory_values(self):
+        """
+        Returns the loaded values of DIRECTORY_FIELDS, leaving out deferred ones
+        """
+        return {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if (field.name in self.DIRECTORY_FIELDS or field.name.startswith('name_'))
+            and field.attname in self.__dict__
+        }
+
+    def has_directory_changed(self):
+        """
+        Whether any of DIRECTORY_FIELDS changed since the store was loaded.
+        Stores that weren't loaded from the database count as changed, and
+        so do fields that were deferred but have been set since.
+        """
+        loaded = getattr(self, '_loaded_directory_values', None)
+        return loaded is None or loaded != self.get_directory_values()
+
     def __str__(self):
         return self.name
 
@@ -203,6 +256,51 @@ class Store(models.Model):
             'remaining_time': remaining_time
         }
 
+    def get_weekly_schedule(self):
+        """
+        Returns the store's opening periods compiled into a WeeklySchedule.
+        The compiled intervals are cached until the opening periods change,
+        for at most STORES_STATUS_CACHE_MAX_TIMEOUT.
+        """
+        if 'opening_periods' in getattr(self, '_prefetched_objects_cache', {}):
+            # Compiling prefetched periods is cheaper than a cache round-trip
+            return WeeklySchedule.from_periods(self.opening_periods.all())
+
+        cache_key = self.get_cache_key('store_schedule')
+        intervals = cache.get(cache_key)
+        if intervals is not None:
+            return WeeklySchedule(intervals)
+
+        schedule = WeeklySchedule.from_periods(self.opening_periods.all())
+        cache.set(cache_key, schedule.intervals, timeout=get_status_cache_max_timeout())
+        return schedule
+
+    def get_time_zone(self):
+        if self.time_zone:
+            return zoneinfo.ZoneInfo(self.time_zone)
+        return get_default_timezone()
+
+    def get_utc_schedule(self, now):
+        """
+        Returns the weekly schedule laid out as UTC timestamps, in the store's
+        time zone, for the week containing ``now`` and the next one.  It's
+        cached until the start of the next week.
+        """
+        prefetched = 'opening_periods' in getattr(self, '_prefetched_objects_cache', {})
+        cache_key = self.get_cache_key('store_utc_schedule')
+        if not prefetched:
+            state = cache.get(cache_key)
+            if state is not None:
+                schedule = UTCSchedule(*state)
+                if schedule.covers(now):
+                    return schedule
+
+        schedule = UTCSchedule.from_weekly(self.get_weekly_schedule(), self.get_time_zone(), now)
+        if not prefetched:
+            timeout = math.ceil(schedule.valid_until - now.timestamp())
+            cache.set(cache_key, schedule.state, timeout=max(timeout, 1))
+        return schedule
+
     def _get_current_status(self):
         """
         Determines the current status of the store.
@@ -210,30 +308,62 @@ class Store(models.Model):
             Tuple[str, timedelta or None]: Status and remaining time (if applicable).
         Prioritizes opening hours: returns 'Closed' if outside working hours.
         """
-        cache_key = f'store_status_{self.pk}'
+        now = timezone.now()
+        if 'current_status' in self.__dict__:
+            # Annotated by StoreQuerySet.with_current_status()
+            status, expires_at = self._get_annotated_status()
+        elif '_current_status' in self.__dict__:
+            # Set by stores.status.prefetch_current_status()
+            status, expires_at = self._current_status
+        else:
+            status, expires_at = self._get_cached_status(now)
+
+        remaining_time = None
+        if expires_at is not None:
+            remaining_time = max(expires_at - now, timedelta(seconds=0))
+        return status, remaining_time
+
+    def get_cache_version(self):
+        """
+        Returns the version all of the store's cache keys include.  It's
+        bumped through stores.cache whenever the store or its related data
+        changes.
+        """
+        if '_cache_version' not in self.__dict__:
+            self._cache_version = get_store_versions([self.pk])[self.pk]
+        return self._cache_version
+
+    def get_cache_key(self, prefix):
+        return store_cache_key(prefix, self.pk, self.get_cache_version())
+
+    def get_status_cache_key(self):
+        return self.get_cache_key('store_status')
+
+    def _get_cached_status(self, now):
+        cache_key = self.get_status_cache_key()
         cached_status = cache.get(cache_key)
-        if cached_status is not None:
-            return cached_status
-
-        now = localtime(timezone.now())
-        current_time = now.time()
-        current_weekday = now.isoweekday()
-
-        # Step 1: Check OpeningPeriod
-        opening_periods = self.opening_periods.filter(weekday=current_weekday)
-        within_opening_hours = False
-        for period in opening_periods:
-            start_time = period.start or time(0, 0)
-            end_time = period.end or time(23, 59, 59)
-            if start_time <= current_time <= end_time:
-                within_opening_hours = True
-                break
-
-        if not within_opening_hours:
+        if cached_status is None:
+            status, expires_at, valid_until = self._resolve_current_status(now)
+            cache.set(cache_key, (status, expires_at), timeout=get_status_cache_timeout(now, valid_until))
+        else:
+            status, expires_at = cached_status
+        return status, expires_at
+
+    def _resolve_current_status(self, now):
+        """
+        Works out the store's status at ``now``.
+        Returns:
+            Tuple[str, datetime or None, datetime or None]: Status, expiry of
+            the busy/closed status (if applicable) and the next moment the
+            status can change (None if it never changes by itself).
+        """
+        # Step 1: Check the compiled opening periods
+        schedule = self.get_utc_schedule(now)
+        valid_until = schedule.next_transition(now)
+
+        if not schedule.is_open_at(now):
             # Not within opening hours, mark as Closed without checking StoreStatus
-            status = 'Closed'
-            cache.set(cache_key, (status, None), timeout=60)
-            return status, None
+            return 'Closed', None, valid_until
 
         # Step 2: Within opening hours, check the latest StoreStatus
         active_status = self.statuses.filter(
@@ -241,24 +371,39 @@ class Store(models.Model):
             expires_at__gte=now
         ).order_by('-set_at').first()
 
-        if active_status:
-            status_display = active_status.get_status_display()
-            if active_status.status in [StoreStatus.StatusChoices.BUSY, StoreStatus.StatusChoices.CLOSED]:
-                remaining_time = active_status.expires_at - now
-                remaining_time = max(remaining_time, timedelta(seconds=0))
-                cache.set(cache_key, (status_display, remaining_time), timeout=60)
-                return status_display, remaining_time
-            elif active_status.status == StoreStatus.StatusChoices.OPEN:
-                status = 'Open'
-            else:
-                status = 'Closed'  # Fallback
-        else:
+        if not active_status:
             # No active status, default to open since within time range
-            status = 'Open'
+            return 'Open', None, valid_until
+
+        if valid_until is None or active_status.expires_at < valid_until:
+            valid_until = active_status.expires_at
+
+        if active_status.status in [StoreStatus.StatusChoices.BUSY, StoreStatus.StatusChoices.CLOSED]:
+            return active_status.get_status_display(), active_status.expires_at, valid_until
+        elif active_status.status == StoreStatus.StatusChoices.OPEN:
+            return 'Open', None, valid_until
+        return 'Closed', None, valid_until  # Fallback
+
+    def _get_annotated_status(self):
+        if self.current_status == StoreStatus.StatusChoices.OPEN:
+            return 'Open', None
+        if not self.within_opening_hours:
+            return 'Closed', None
+        return StoreStatus.StatusChoices(self.current_status).label, self.active_status_expires_at
+
+    def _resolve_annotated_status(self, now):
+        """
+        Same as _resolve_current_status, for a store annotated by
+        StoreQuerySet.with_current_status(now).
+        """
+        status, expires_at = self._get_annotated_status()
+        valid_until = self.get_utc_schedule(now).next_transition(now)
+        status_expires_at = self.active_status_expires_at
+        if self.within_opening_hours and status_expires_at is not None:
+            if valid_until is None or status_expires_at < valid_until:
+                valid_until = status_expires_at
+        return status, expires_at, valid_until
 
-        cache.set(cache_key, (status, None), timeout=60)
-        return status, None
-    
 class OpeningPeriod(models.Model):
     PERIOD_FORMAT = _("%(start)s - %(end)s")
     (MONDAY, TUESDAY, WEDNESDAY, THURSDAY,
@@ -416,24 +561,25 @@ class StoreStatus(models.Model):
     store = models.ForeignKey('Store', on_delete=models.CASCADE, related_name='statuses')
     status = models.CharField(max_length=10, choices=StatusChoices.choices)
     duration = models.DurationField(null=True, blank=True, help_text=_("Duration for which the status is active"))
-    set_at = models.DateTimeField(auto_now_add=True)
+    set_at = models.DateTimeField(default=now, editable=False)
     expires_at = models.DateTimeField(null=True, blank=True)
 
-    def save(self, *args, **kwargs):
-        if not self.pk:
-            super().save(*args, **kwargs)  # Assign set_at if new
-
-        # Calculate expires_at based on duration
-        if self.duration:
-            new_expires_at = self.set_at + self.duration
-        else:
-            # Permanent status: expires at end of the day
-            today = self.set_at.date()
-            new_expires_at = datetime.combine(today, time(23, 59, 59))
-            new_expires_at = make_aware(new_expires_at)
+    @staticmethod
+    def get_expires_at(set_at, duration):
+        """
+        Returns when a status set at ``set_at`` for ``duration`` expires.
+        """
+        if duration:
+            return set_at + duration
+        # Permanent status: expires at end of the day
+        today = localtime(set_at).date()
+        return make_aware(datetime.combine(today, time(23, 59, 59)))
 
-        # Update expires_at without triggering save() again
-        StoreStatus.objects.filter(pk=self.pk).update(expires_at=new_expires_at)
+    def save(self, *args, **kwargs):
+        # expires_at is worked out up front so it's written with the rest of
+        # the row, in a single INSERT/UPDATE
+        self.expires_at = self.get_expires_at(self.set_at, self.duration)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.store.name} - {self.get_status_display()}"
@@ -442,7 +588,18 @@ class StoreStatus(models.Model):
         verbose_name = _("Store Status")
         verbose_name_plural = _("Store Statuses")
         ordering = ['-set_at']
-        
+        indexes = [
+            # Covers the active status lookup, which filters on store and
+            # expiry and orders by set_at.  Rows without an expiry never match.
+            models.Index(
+                fields=['store', 'expires_at', 'set_at'],
+                include=['status'],
+                condition=models.Q(expires_at__isnull=False),
+                name='stores_status_active_idx',
+            ),
+            # Used by the prune_store_statuses retention job
+            models.Index(fields=['expires_at'], name='stores_status_expires_idx'),
+        ]
 
 class StoreRating(models.Model):
     store = models.ForeignKey(
@@ -519,3 +676,25 @@ class StoreRating(models.Model):
         self.store.total_ratings = store_ratings['total_ratings'] or 0
         self.store.save()
         
+
+
+class GeoCodeResult(models.Model):
+    """
+    A geocoded search query, used as a shared cache by
+    CachedGeoCodeService when STORES_GEOCODE_DB_CACHE is set.  A result
+    without a location records a query that had no results.
+    """
+    QUERY_MAX_LENGTH = 255
+
+    query = models.CharField(_("Normalised query"), max_length=QUERY_MAX_LENGTH, unique=True)
+    location = PointField(_("Location"), srid=get_geodetic_srid(), null=True, blank=True)
+    updated_at = models.DateTimeField(_("Updated at"), auto_now=True)
+
+    class Meta:
+        abstract = True
+        app_label = 'stores'
+        verbose_name = _("Geocode result")
+        verbose_name_plural = _("Geocode results")
+
+    def __str__(self):
+        return self.query
@@ -5,6 +5,8 @@ from django.utils.translation import get_language
 from django import forms
 from mapwidgets.widgets import GoogleMapPointFieldWidget
 
+from stores.cache import bump_store_versions
+
 Store = get_model('stores', 'Store')
 # StoreGroup = get_model('stores', 'StoreGroup')
 OpeningPeriod = get_model('stores', 'OpeningPeriod')
@@ -34,7 +36,9 @@ class StoreStatusInline(admin.TabularInline):
     extra = 1
 
 def deactivate_stores(modeladmin, request, queryset):
+    pks = list(queryset.values_list('pk', flat=True))
     queryset.update(is_active=False)
+    bump_store_versions(pks)
 deactivate_stores.short_description = "Deactivate selected stores"
 
 
@@ -71,7 +75,7 @@ class StoreAdmin(admin.ModelAdmin):
         'fields': ('name_en', 'name_ar', 'slug', 'description_ar', 'description_en', 'vendor', 'preparing_time','minimum_order_value','rating','total_ratings', 'image')
     }),
     ('Location Information', {
-        'fields': ('city', 'location'),
+        'fields': ('city', 'location', 'service_area', 'time_zone'),
         'classes': ('collapse',),
     }),
     ('Status', {
@@ -14,12 +14,30 @@ class StoresConfig(OscarConfig):
     namespace = 'stores'
 
     def ready(self):
+        from . import receivers  # noqa
+
         self.list_view = get_class('stores.views', 'StoreListView')
+        self.list_page_view = get_class('stores.views', 'StoreListPageView')
         self.detail_view = get_class('stores.views', 'StoreDetailView')
+        self.cluster_view = get_class('stores.views', 'StoreClusterView')
+        self.tile_view = get_class('stores.views', 'StoreTileView')
+        self.viewport_view = get_class('stores.views', 'StoreViewportView')
+        self.markers_view = get_class('stores.views', 'StoreMarkersView')
+        self.api_list_view = get_class('stores.views', 'StoreApiListView')
+        self.api_search_view = get_class('stores.views', 'StoreApiSearchView')
+        self.api_detail_view = get_class('stores.views', 'StoreApiDetailView')
 
     def get_urls(self):
         urls = [
             path('', self.list_view.as_view(), name='index'),
+            path('page.json', self.list_page_view.as_view(), name='index-page'),
+            path('clusters/', self.cluster_view.as_view(), name='clusters'),
+            path('viewport/', self.viewport_view.as_view(), name='viewport'),
+            path('markers.json', self.markers_view.as_view(), name='markers'),
+            path('api/stores/', self.api_list_view.as_view(), name='api-list'),
+            path('api/stores/search/', self.api_search_view.as_view(), name='api-search'),
+            path('api/stores/<int:pk>/', self.api_detail_view.as_view(), name='api-detail'),
+            path('tiles/<int:zoom>/<int:x>/<int:y>.mvt', self.tile_view.as_view(), name='tile'),
             path('<slug:dummyslug>/<int:pk>/', self.detail_view.as_view(), name='detail'),
         ]
         return self.post_process_urls(urls)
@@ -0,0 +1,152 @@
+"""
+Versioned cache keys for everything cached per store.
+
+Each store has a version number in the cache, and every per-store cache key
+includes it.  Bumping the version orphans all of the store's cached entries
+at once, so nothing needs to know which keys exist.  Versions are bumped
+from the post_save/post_delete signals of every model registered with
+:func:`register`, and by :func:`invalidate_stores` for bulk queryset paths
+that bypass signals, such as ``update()`` and ``bulk_create()``.
+
+Old versions' entries are never deleted, only orphaned, so every entry
+cached under a versioned key must have a finite timeout, or each bump would
+leave it behind for good in caches that don't evict, such as Redis with its
+default ``noeviction`` policy.  Only the version keys themselves, one per
+store plus the directory's, are kept without a timeout.
+
+Caches spanning many stores, such as map clusters and markers, use the
+directory version instead.  It's only bumped when a store is created,
+deleted, or one of its ``DIRECTORY_FIELDS`` such as its location changes,
+so status changes and ratings leave those caches alone.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+_registry = {}
+
+DIRECTORY_VERSION_KEY = 'store_directory_version'
+
+
+def get_version_key(pk):
+    return f'store_cache_version_{pk}'
+
+
+def new_version():
+    # Versions are never reset to a small number, so a version key evicted
+    # from the cache can't bring back entries cached under an old version.
+    return time.time_ns()
+
+
+def store_cache_key(prefix, pk, version):
+    return f'{prefix}_{pk}_{version}'
+
+
+def get_store_versions(pks):
+    """
+    Return a dict of the cache version of each store, in one round-trip
+    """
+    keys = {get_version_key(pk): pk for pk in pks}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+
+    missing = {key: new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update((keys[key], version) for key, version in missing.items())
+    return versions
+
+
+def load_store_versions(stores):
+    """
+    Fetch the cache versions of many stores at once and store them on the
+    instances, so building their cache keys doesn't cost a round-trip each
+    """
+    stores = [store for store in stores if '_cache_version' not in store.__dict__]
+    if not stores:
+        return
+    versions = get_store_versions([store.pk for store in stores])
+    for store in stores:
+        store._cache_version = versions[store.pk]
+
+
+def get_directory_version():
+    """
+    Return the version of caches that depend on any store
+    """
+    version = cache.get(DIRECTORY_VERSION_KEY)
+    if version is None:
+        version = new_version()
+        if not cache.add(DIRECTORY_VERSION_KEY, version, timeout=None):
+            version = cache.get(DIRECTORY_VERSION_KEY, version)
+    return version
+
+
+def bump_directory_version():
+    """
+    Invalidate the caches that depend on any store
+    """
+    cache.set(DIRECTORY_VERSION_KEY, new_version(), timeout=None)
+
+
+def bump_store_versions(pks, directory=True):
+    """
+    Invalidate every cache entry of the given stores in one round-trip,
+    along with the caches that depend on any store unless ``directory`` is
+    false, e.g. when only their statuses changed
+    """
+    versions = {pk: new_version() for pk in set(pks)}
+    if versions:
+        keys = {get_version_key(pk): version for pk, version in versions.items()}
+        if directory:
+            keys[DIRECTORY_VERSION_KEY] = new_version()
+        cache.set_many(keys, timeout=None)
+    return versions
+
+
+def invalidate_stores(queryset, directory=True):
+    """
+    Invalidate the caches of every store in ``queryset``.  Call this around
+    bulk operations that don't send model signals, passing
+    ``directory=False`` when they don't touch the stores' DIRECTORY_FIELDS.
+    """
+    return bump_store_versions(queryset.values_list('pk', flat=True), directory=directory)
+
+
+def register(model, store_field='store'):
+    """
+    Invalidate a store's caches whenever an instance of ``model`` is saved
+    or deleted.  ``store_field`` names the foreign key to the store, or is
+    ``None`` for the store model itself, which must provide
+    ``has_directory_changed()`` and ``get_directory_values()``.
+    """
+    _registry[model] = store_field
+    uid = f'stores.cache.{model._meta.label_lower}'
+    post_save.connect(invalidate_instance, sender=model, dispatch_uid=uid)
+    post_delete.connect(invalidate_instance, sender=model, dispatch_uid=uid)
+
+
+def invalidate_instance(sender, instance, **kwargs):
+    store_field = _registry[sender]
+    if store_field is None:
+        directory = (kwargs.get('signal') is post_delete or kwargs.get('created')
+                     or instance.has_directory_changed())
+        versions = bump_store_versions([instance.pk], directory=directory)
+        instance._cache_version = versions[instance.pk]
+        instance._loaded_directory_values = instance.get_directory_values()
+        return
+
+    pk = getattr(instance, f'{store_field}_id')
+    if pk is None:
+        return
+    versions = bump_store_versions([pk], directory=False)
+    field = sender._meta.get_field(store_field)
+    if field.is_cached(instance):
+        store = field.get_cached_value(instance)
+        if store is not None:
+            store._cache_version = versions[pk]
+
+
+def invalidate_directory(sender, instance, **kwargs):
+    bump_directory_version()
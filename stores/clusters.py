@@ -0,0 +1,97 @@
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Min, Q, Value
+from django.db.models.functions import Floor
+from oscar.core.loading import get_model
+
+from stores.cache import get_directory_version
+from stores.functions import PointX, PointY
+from stores.tiles import ORIGIN, WEB_MERCATOR_SRID, tile_lnglat_bounds
+from stores.utils import get_cluster_cache_timeout, get_cluster_grid_size, get_geodetic_srid
+
+
+def cluster_tiles(queryset, tiles, zoom, grid_size):
+    """
+    Aggregates the stores of ``queryset`` within ``tiles`` into a
+    ``grid_size`` by ``grid_size`` grid per tile, in a single query.
+    Returns the clusters of each tile by ``(x, y)``: one dict per occupied
+    cell with the mean location and number of stores, and the store's pk
+    when there's only one.
+    """
+    cell = 2 * ORIGIN / 2 ** zoom / grid_size
+    mercator = Transform('location', WEB_MERCATOR_SRID)
+    srid = get_geodetic_srid()
+
+    # Uses the spatial index.  Stores in a neighbouring tile's cells, or on
+    # a tile edge, are then told apart by the cell they fall in below.
+    in_tiles = Q()
+    for x, y in tiles:
+        in_tiles |= Q(location__bboverlaps=Polygon.from_bbox(
+            tile_lnglat_bounds(zoom, x, y), srid=srid))
+
+    rows = (
+        queryset
+        .filter(in_tiles)
+        .alias(mx=PointX(mercator), my=PointY(mercator))
+        # Cells are numbered across the whole world, from its top left
+        # corner, so a cell's tile is its number divided by grid_size
+        .annotate(
+            cell_x=Floor((F('mx') + Value(ORIGIN)) / Value(cell)),
+            cell_y=Floor((Value(ORIGIN) - F('my')) / Value(cell)))
+        .values('cell_x', 'cell_y')
+        .annotate(
+            count=Count('pk'),
+            lng=Avg(PointX('location')),
+            lat=Avg(PointY('location')),
+            first_pk=Min('pk'))
+        .order_by())
+
+    clusters = {tile: [] for tile in tiles}
+    for row in rows:
+        tile = (int(row['cell_x']) // grid_size, int(row['cell_y']) // grid_size)
+        if tile not in clusters:
+            continue
+        cluster = {
+            'lng': round(row['lng'], 6),
+            'lat': round(row['lat'], 6),
+            'count': row['count'],
+        }
+        if row['count'] == 1:
+            cluster['pk'] = row['first_pk']
+        clusters[tile].append(cluster)
+    return clusters
+
+
+def get_clusters(tiles, zoom, group=None):
+    """
+    Returns the clusters of active stores in ``tiles`` at ``zoom``.  Each
+    tile's clusters are cached under the store directory version, so
+    adding, removing or moving a store invalidates them.  Cached tiles are
+    read in one round-trip and the others clustered in one query.
+    """
+    Store = get_model('stores', 'Store')
+
+    version = get_directory_version()
+    group_id = group.pk if group else ''
+    keys = {
+        f'store_clusters_{version}_{group_id}_{zoom}_{x}_{y}': (x, y)
+        for x, y in tiles
+    }
+    found = cache.get_many(keys)
+
+    queryset = Store.objects.filter(is_active=True)
+    if group:
+        queryset = queryset.filter(group=group)
+
+    missing = {}
+    missing_tiles = [tile for key, tile in keys.items() if key not in found]
+    if missing_tiles:
+        tile_clusters = cluster_tiles(queryset, missing_tiles, zoom, get_cluster_grid_size())
+        missing = {key: tile_clusters[tile] for key, tile in keys.items() if key not in found}
+        cache.set_many(missing, timeout=get_cluster_cache_timeout())
+
+    clusters = []
+    for key in keys:
+        clusters.extend(found[key] if key in found else missing[key])
+    return clusters
@@ -31,6 +31,7 @@ class StoresDashboardConfig(OscarDashboardConfig):
         self.store_group_update_view = get_class('stores.dashboard.views', 'StoreGroupUpdateView')
         self.store_group_delete_view = get_class('stores.dashboard.views', 'StoreGroupDeleteView')
         self.change_store_status = get_class('stores.dashboard.views', 'change_store_status')
+        self.change_branches_status = get_class('stores.dashboard.views', 'change_branches_status')
 
     def get_urls(self):
         urls = [
@@ -43,6 +44,7 @@ class StoresDashboardConfig(OscarDashboardConfig):
             path('groups/update/<int:pk>/', self.store_group_update_view.as_view(), name='store-group-update'),
             path('groups/delete/<int:pk>/', self.store_group_delete_view.as_view(), name='store-group-delete'),
             path('change-store-status/', self.change_store_status, name='change_store_status'),
+            path('change-branches-status/', self.change_branches_status, name='change_branches_status'),
 
         ]
         return self.post_process_urls(urls)
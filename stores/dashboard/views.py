@@ -12,12 +12,11 @@ from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST
-from django.db import IntegrityError
-from django.core.cache import cache
 from server.apps.vendor.mixins import VendorMixin
 from django.http import HttpResponseRedirect
 
 MapsContextMixin = get_class('stores.views', 'MapsContextMixin')
+prefetch_current_status = get_class('stores.status', 'prefetch_current_status')
 (DashboardStoreSearchForm,
  OpeningHoursInline,
  OpeningPeriodForm,
@@ -60,7 +59,8 @@ class StoreListView(VendorMixin, generic.ListView):
         data = super().get_context_data(**kwargs)
         data['filterform'] = self.filterform
         data['queryset_description'] = self.get_title()
-        
+        prefetch_current_status(data['store_list'])
+
         # Get the vendor and their business details
         vendor = self.get_vendor()
         if vendor:
@@ -88,8 +88,10 @@ class StoreListView(VendorMixin, generic.ListView):
         self.filterform = self.filterform_class(self.request.GET)
         if self.filterform.is_valid():
             qs = self.filterform.apply_filters(qs)
-            
-        return qs
+
+        # Opening periods let the page's statuses be resolved without
+        # another query for them
+        return qs.select_related('address', 'group', 'city').prefetch_related('opening_periods')
 
 
 class StoreAddressInline(InlineFormSetFactory):
@@ -286,6 +288,25 @@ class StoreGroupDeleteView(generic.DeleteView):
         messages.success(self.request, _("Store group deleted"))
         return response
 
+def get_status_duration(duration_choice):
+    """
+    Turns the duration picked in the dashboard into a timedelta.  ``None``
+    means the status lasts until the end of the day.
+    """
+    if duration_choice == "end_of_day":
+        # Calculate duration until the end of the day
+        current_time = now()
+        end_of_day = current_time.replace(hour=23, minute=59, second=59, microsecond=999999)
+        return end_of_day - current_time
+
+    duration_mapping = {
+        "permanently": None,
+        "1_hour": timedelta(hours=1),
+        "2_hours": timedelta(hours=2),
+    }
+    return duration_mapping.get(duration_choice, None)
+
+
 @csrf_protect
 @require_POST
 def change_store_status(request):
@@ -294,58 +315,48 @@ def change_store_status(request):
     duration_choice = request.POST.get('duration')
 
     # Validate required fields
-    if not store_id or not new_status:
+    if not store_id or new_status not in StoreStatus.StatusChoices.values:
         messages.error(request, "Invalid store ID or status.")
         return redirect(reverse('stores-dashboard:store-list'))
-    
+
     # Fetch the store or return 404 if not found
     store = get_object_or_404(Store, id=store_id)
 
-    # Calculate duration based on duration_choice
-    duration_mapping = {
-        "end_of_day": timedelta(hours=now().hour, minutes=now().minute, seconds=now().second, microseconds=now().microsecond),
-        "permanently": None,
-        "1_hour": timedelta(hours=1),
-        "2_hours": timedelta(hours=2),
-    }
+    StoreStatus.objects.create(
+        store=store,
+        status=new_status,
+        duration=get_status_duration(duration_choice),
+    )
+    messages.success(request, f"Store status set to {new_status} successfully.")
 
-    duration = duration_mapping.get(duration_choice, None)
+    # Redirect back to the store list page or any other desired page
+    return redirect(reverse('stores-dashboard:store-list'))
 
-    # Determine duration to set
-    if duration_choice == "end_of_day":
-        # Calculate duration until the end of the day
-        end_of_day = now().replace(hour=23, minute=59, second=59, microsecond=999999)
-        duration = end_of_day - now()
-
-    # Try to update an existing active StoreStatus
-    try:
-        # Create a new StoreStatus entry
-        StoreStatus.objects.create(
-            store=store,
-            status=new_status,
-            duration=duration,
-            set_at=now(),
-            expires_at=(now() + duration) if duration else None,
-        )
-    except StoreStatus.DoesNotExist:
-        try:
-            # Update or create the StoreStatus object
-            StoreStatus.objects.update_or_create(
-                store=store,  # Match condition
-                defaults={
-                    'status': new_status,  # Fields to update or set
-                    'duration': duration,
-                    'set_at': now()
-                }
-            )
-            messages.success(request, f"Store status set to {new_status} successfully.")
-        except IntegrityError:
-            # Handle the case where another active StoreStatus was created concurrently
-            messages.error(request, "Unable to set store status due to a concurrent update. Please try again.")
-    
-    # Invalidate the cache for the store's current status
-    cache_key = f'store_status_{store.pk}'
-    cache.delete(cache_key)
 
-    # Redirect back to the store list page or any other desired page
-    return redirect(reverse('stores-dashboard:store-list'))
\ No newline at end of file
+@csrf_protect
+@require_POST
+def change_branches_status(request):
+    """
+    Sets the same status on several of the vendor's branches at once, or on
+    all of them when no ``store_ids`` are posted.
+    """
+    store_ids = request.POST.getlist('store_ids')
+    new_status = request.POST.get('status')
+    duration_choice = request.POST.get('duration')
+
+    if not all(pk.isdigit() for pk in store_ids):
+        messages.error(request, "Invalid branch selection.")
+        return redirect(reverse('stores-dashboard:store-list'))
+
+    if new_status not in StoreStatus.StatusChoices.values:
+        messages.error(request, "Invalid status.")
+        return redirect(reverse('stores-dashboard:store-list'))
+
+    stores = Store.objects.filter(vendor=request.user.vendor)
+    if store_ids:
+        stores = stores.filter(pk__in=store_ids)
+
+    statuses = stores.set_status(new_status, get_status_duration(duration_choice))
+    messages.success(
+        request, f"Status set to {new_status} for {len(statuses)} branches successfully.")
+    return redirect(reverse('stores-dashboard:store-list'))
@@ -1,10 +1,12 @@
 from django import forms
-from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.gis.geos import GEOSGeometry, Point
 from django.utils.translation import gettext as _
 from oscar.core.loading import get_class, get_model
 from django.contrib.gis.forms.widgets import OSMWidget
 
-from stores.utils import get_geodetic_srid
+from stores.pagination import InvalidCursor, decode_keyset_cursor
+from stores.tiles import MAX_ZOOM, tiles_for_bbox
+from stores.utils import get_cluster_max_tiles, get_geodetic_srid
 
 geocode = get_class('stores.services', 'geocode')
 StoreGroup = get_model('stores', 'StoreGroup')
@@ -40,6 +42,11 @@ class StoreSearchForm(forms.Form):
         queryset=StoreGroup.objects.none(),
         widget=forms.Select(attrs={'data-behaviours': 'filter-group'}),
     )
+    open_now = forms.BooleanField(
+        label=_("Open now"),
+        required=False,
+        widget=forms.CheckboxInput(attrs={'data-behaviours': 'filter-open-now'}),
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -73,6 +80,77 @@ class StoreSearchForm(forms.Form):
         query = data.get('query', None)
         if query is not None:
             try:
-                return geocode.GeoCodeService().geocode(query)
+                return geocode.get_service().geocode(query)
             except geocode.ServiceError:
                 return None
+
+
+class BBoxField(forms.CharField):
+    """
+    A ``min_lng,min_lat,max_lng,max_lat`` bounding box, cleaned to a tuple
+    of floats.  ``min_lng`` is greater than ``max_lng`` for boxes crossing
+    the antimeridian.
+    """
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if not value:
+            return None
+        try:
+            bbox = tuple(float(part) for part in value.split(','))
+        except ValueError:
+            bbox = ()
+        if len(bbox) != 4:
+            raise forms.ValidationError(_("Enter a bounding box as min_lng,min_lat,max_lng,max_lat"))
+        min_lng, min_lat, max_lng, max_lat = bbox
+        if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180
+                and -90 <= min_lat <= max_lat <= 90):
+            raise forms.ValidationError(_("The bounding box is out of range"))
+        return bbox
+
+
+class StoreClusterForm(forms.Form):
+    bbox = BBoxField()
+    zoom = forms.IntegerField(min_value=0, max_value=MAX_ZOOM)
+    group = forms.ModelChoiceField(required=False, queryset=StoreGroup.objects.all())
+
+    def clean(self):
+        cleaned_data = super().clean()
+        bbox, zoom = cleaned_data.get('bbox'), cleaned_data.get('zoom')
+        if bbox is not None and zoom is not None:
+            self.tiles = tiles_for_bbox(bbox, zoom)
+            if len(self.tiles) > get_cluster_max_tiles():
+                raise forms.ValidationError(_("The bounding box is too large for this zoom level"))
+        return cleaned_data
+
+
+class StoreViewportForm(StoreSearchForm):
+    """
+    Searches the stores within a map viewport, with the group and open now
+    filters of the store search
+    """
+    bbox = BBoxField()
+    cursor = forms.CharField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=500)
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data.get('cursor')
+        if not cursor:
+            return None
+        try:
+            return decode_keyset_cursor(cursor, (int, float))
+        except InvalidCursor as e:
+            raise forms.ValidationError(str(e))
+
+    def get_centre(self):
+        """
+        Return the centre of the viewport, which results are ordered by
+        their distance from
+        """
+        min_lng, min_lat, max_lng, max_lat = self.cleaned_data['bbox']
+        if min_lng > max_lng:
+            max_lng += 360
+        lng = (min_lng + max_lng) / 2
+        if lng > 180:
+            lng -= 360
+        return Point(lng, (min_lat + max_lat) / 2, srid=get_geodetic_srid())
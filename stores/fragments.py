@@ -0,0 +1,62 @@
+"""
+Cached HTML fragments of store templates.
+
+Fragments only render store data, so they're cached under the store's cache
+version and the active language: saving a store or anything registered with
+:mod:`stores.cache` orphans them.  Anything time-sensitive, such as the
+store's open/closed status, must stay out of fragment templates.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.translation import get_language
+
+from stores.cache import load_store_versions
+from stores.utils import get_fragment_cache_timeout
+
+FRAGMENT_TEMPLATES = {
+    'card': 'stores/partials/store_card.html',
+    'details': 'stores/partials/store_details.html',
+}
+
+
+def get_fragment_cache_key(store, name):
+    return store.get_cache_key(f'store_fragment_{name}_{get_language() or ""}')
+
+
+def render_fragment(store, name):
+    return render_to_string(FRAGMENT_TEMPLATES[name], {'store': store})
+
+
+def prefetch_fragments(stores, name):
+    """
+    Loads the ``name`` fragment of a page of stores in bulk.  Cache versions
+    and cached fragments are each read with a single ``cache.get_many``, and
+    the fragments rendered for the misses are written with one
+    ``cache.set_many``.
+    """
+    stores = [store for store in stores
+              if name not in store.__dict__.get('_fragments', {})]
+    if not stores:
+        return
+
+    load_store_versions(stores)
+    keys = {get_fragment_cache_key(store, name): store for store in stores}
+
+    cached = cache.get_many(keys)
+    missing = {}
+    for key, store in keys.items():
+        if key in cached:
+            html = cached[key]
+        else:
+            html = missing[key] = render_fragment(store, name)
+        store.__dict__.setdefault('_fragments', {})[name] = html
+    if missing:
+        cache.set_many(missing, timeout=get_fragment_cache_timeout())
+
+
+def get_fragment(store, name):
+    """
+    Returns the ``name`` fragment of a store, from the cache when possible
+    """
+    prefetch_fragments([store], name)
+    return store._fragments[name]
@@ -0,0 +1,87 @@
+from django.contrib.gis.db.models.functions import GeoFunc
+from django.db.models import DateTimeField, FloatField, Func, IntegerField, TimeField
+
+
+class WallTime(Func):
+    """
+    The wall time of ``expression`` in the time zone named by ``time_zone``,
+    which can vary per row.  PostgreSQL's ``timezone(zone, timestamptz)``
+    returns it as a timestamp without time zone, with DST applied.
+    """
+    function = 'timezone'
+    output_field = DateTimeField()
+
+    def __init__(self, time_zone, expression, **extra):
+        super().__init__(time_zone, expression, **extra)
+
+
+class IsoWeekDay(Func):
+    """
+    ISO weekday (Monday is 1) of a timestamp without time zone
+    """
+    template = 'EXTRACT(ISODOW FROM %(expressions)s)'
+    output_field = IntegerField()
+
+
+class TimeOfDay(Func):
+    """
+    Time part of a timestamp without time zone, in whole seconds
+    """
+    template = "date_trunc('second', %(expressions)s)::time"
+    output_field = TimeField()
+
+
+class KNNDistance(GeoFunc):
+    """
+    PostGIS's ``<->`` distance operator.  Ordering by it lets a spatial index
+    return the nearest rows first without computing every distance.  For
+    geometry columns the distance is planar, in the units of the SRID, so
+    it only ranks correctly for projected SRIDs.  Use GeographyKNNDistance
+    for geodetic ones.
+    """
+    function = ''
+    template = '%(expressions)s'
+    arg_joiner = ' <-> '
+    geom_param_pos = (0, 1)
+    output_field = FloatField()
+
+
+class GeographyKNNDistance(Func):
+    """
+    PostGIS's ``<->`` distance operator between geographies, in metres on
+    the sphere, which a GiST index on the geography expression can order by
+    """
+    template = '%(expressions)s'
+    arg_joiner = ' <-> '
+    output_field = FloatField()
+
+
+class PointX(GeoFunc):
+    """
+    X coordinate, the longitude for geodetic SRIDs, of a point
+    """
+    function = 'ST_X'
+    output_field = FloatField()
+
+
+class PointY(GeoFunc):
+    """
+    Y coordinate, the latitude for geodetic SRIDs, of a point
+    """
+    function = 'ST_Y'
+    output_field = FloatField()
+
+
+class AsMVTGeom(GeoFunc):
+    """
+    A Web Mercator geometry clipped and scaled to the integer coordinates of
+    tile ``zoom``/``x``/``y`` by PostGIS's ``ST_AsMVTGeom``
+    """
+    function = 'ST_AsMVTGeom'
+    template = (
+        '%(function)s(%(expressions)s, ST_TileEnvelope(%(zoom)d, %(x)d, %(y)d), '
+        '%(extent)d, %(buffer)d, true)')
+
+    def __init__(self, expression, zoom, x, y, extent=4096, buffer=64, **extra):
+        super().__init__(expression, zoom=int(zoom), x=int(x), y=int(y),
+                         extent=int(extent), buffer=int(buffer), **extra)
@@ -0,0 +1,87 @@
+import random
+import time
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from oscar.core.loading import get_model
+
+from stores.utils import get_geodetic_srid
+
+Store = get_model('stores', 'Store')
+
+
+class Command(BaseCommand):
+    help = ("Compare the query plan and latency of radius searches filtered on a "
+            "distance annotation with index-backed ST_DWithin searches")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lng', type=float, default=46.6753)
+        parser.add_argument('--lat', type=float, default=24.7136)
+        parser.add_argument('--km', type=float, default=10, help="Search radius in kilometres")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs of each query to time")
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Create this many random active stores around the search point first. "
+                 "They are rolled back afterwards.")
+        parser.add_argument('--vendor', type=int, help="Vendor id for the seeded stores")
+        parser.add_argument('--spread', type=float, default=5,
+                            help="Spread of the seeded stores, in degrees")
+
+    def handle(self, *args, **options):
+        if options['seed'] and not options['vendor']:
+            raise CommandError("--vendor is required with --seed")
+
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options)
+            self.benchmark(options)
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        srid = get_geodetic_srid()
+        spread = options['spread']
+        stores = (
+            Store(
+                vendor_id=options['vendor'],
+                name='Benchmark store %d' % i,
+                slug='benchmark-store-%d' % i,
+                location=Point(options['lng'] + random.uniform(-spread, spread),
+                               options['lat'] + random.uniform(-spread, spread), srid=srid),
+            )
+            for i in range(options['seed'])
+        )
+        Store.objects.bulk_create(stores, batch_size=5000)
+        # Refresh planner statistics so the plans reflect the seeded data
+        with transaction.get_connection().cursor() as cursor:
+            cursor.execute('ANALYZE %s' % Store._meta.db_table)
+        self.stdout.write("Seeded %d stores" % options['seed'])
+
+    def benchmark(self, options):
+        point = Point(options['lng'], options['lat'], srid=get_geodetic_srid())
+        radius = D(km=options['km'])
+        stores = Store.objects.filter(is_active=True)
+
+        queries = {
+            'distance annotation': (
+                stores.annotate(distance=Distance('location', point))
+                .filter(distance__lte=radius).order_by('distance')),
+            'ST_DWithin': (
+                stores.within_distance(point, radius)
+                .annotate(distance=Distance('location', point)).order_by('distance')),
+        }
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(analyze=True))
+
+            timings = []
+            for __ in range(options['repeat']):
+                start = time.perf_counter()
+                count = len(queryset.all())
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                "%d stores, median %.2f ms, best %.2f ms over %d runs\n" % (
+                    count, timings[len(timings) // 2] * 1000, timings[0] * 1000, len(timings)))
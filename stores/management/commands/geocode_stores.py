@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from oscar.core.loading import get_class, get_model
+
+from stores.abstract_models import DEFAULT_LOCATION
+from stores.cache import bump_store_versions
+from stores.utils import get_geodetic_srid
+from stores.vector_tiles import invalidate_tiles
+
+geocode = get_class('stores.services', 'geocode')
+Store = get_model('stores', 'Store')
+
+
+class RateLimiter:
+    """
+    Spaces out calls from any number of threads to at most ``rate`` a second
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Command(BaseCommand):
+    help = ("Geocode the addresses of stores whose location is still the default one. "
+            "Stores are processed in primary key order, so an interrupted run can be "
+            "resumed with --after-pk, and re-running only picks up stores left behind.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend', default='stores.services.geocode.GeoCodeService',
+            help="Dotted path of the geocoder class to use")
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent geocoding requests")
+        parser.add_argument('--rate', type=float, default=10,
+                            help="Maximum geocoding requests per second, 0 for no limit")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Stores read and updated per query")
+        parser.add_argument('--after-pk', type=int, default=0,
+                            help="Only process stores with a greater primary key")
+        parser.add_argument('--vendor', type=int, help="Only process this vendor's stores")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Geocode but don't save the locations")
+
+    def handle(self, *args, **options):
+        try:
+            self.service = import_string(options['backend'])()
+        except ImportError as e:
+            raise CommandError(e)
+        self.limiter = RateLimiter(options['rate'])
+        # Normalised address -> (lng, lat), or None when it can't be geocoded
+        self.results = {}
+        self.srid = get_geodetic_srid()
+
+        stores = (
+            Store.objects
+            .filter(location__equals=Point(DEFAULT_LOCATION.x, DEFAULT_LOCATION.y, srid=self.srid))
+            .select_related('address', 'address__country')
+            .order_by('pk'))
+        if options['vendor']:
+            stores = stores.filter(vendor_id=options['vendor'])
+
+        last_pk, updated, skipped = options['after_pk'], 0, 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                chunk = list(stores.filter(pk__gt=last_pk)[:options['chunk_size']])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+
+                located = self.geocode_chunk(executor, chunk)
+                if located and not options['dry_run']:
+                    Store.objects.bulk_update(located, ['location'])
+                    bump_store_versions([store.pk for store in located])
+                    invalidate_tiles([DEFAULT_LOCATION] + [store.location for store in located])
+                updated += len(located)
+                skipped += len(chunk) - len(located)
+                self.stdout.write("Processed stores up to pk %d: %d located, %d skipped" % (
+                    last_pk, updated, skipped))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Located %d stores, %d could not be geocoded" % (updated, skipped)))
+
+    def get_address(self, store):
+        try:
+            address = store.address
+        except Store.address.RelatedObjectDoesNotExist:
+            return ''
+        return address.summary
+
+    def geocode_chunk(self, executor, chunk):
+        # Stores are grouped by normalised address, but the geocoder gets the
+        # address as written, since normalising drops characters it needs
+        addresses = {}
+        for store in chunk:
+            address = self.get_address(store)
+            key = geocode.normalize_query(address)
+            if key:
+                addresses.setdefault(key, (address, []))[1].append(store)
+
+        pending = [key for key in addresses if key not in self.results]
+        queries = [addresses[key][0] for key in pending]
+        for key, coords in zip(pending, executor.map(self.geocode_address, queries)):
+            self.results[key] = coords
+
+        located = []
+        for key, (_address, address_stores) in addresses.items():
+            coords = self.results[key]
+            if coords is None:
+                continue
+            for store in address_stores:
+                store.location = Point(*coords, srid=self.srid)
+                located.append(store)
+        return located
+
+    def geocode_address(self, address):
+        self.limiter.wait()
+        try:
+            point = self.service.geocode(address)
+        except geocode.ZeroResuls:
+            return None
+        except geocode.ServiceError as e:
+            self.stderr.write("Could not geocode %r: %r" % (address, e))
+            return None
+        return (point.x, point.y)
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from oscar.core.loading import get_model
+
+from stores.utils import get_status_retention_days
+
+StoreStatus = get_model('stores', 'StoreStatus')
+
+
+class Command(BaseCommand):
+    help = "Delete store statuses that expired longer ago than the retention window"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=get_status_retention_days(),
+            help="Keep statuses that expired within this many days "
+                 "(default: STORES_STATUS_RETENTION_DAYS or 30)")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of statuses deleted per query")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report how many statuses would be deleted")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = StoreStatus.objects.filter(expires_at__lt=cutoff).order_by('expires_at')
+
+        if options['dry_run']:
+            self.stdout.write("%d statuses expired before %s" % (expired.count(), cutoff))
+            return
+
+        total = 0
+        while True:
+            pks = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            # Expired statuses can't affect a cached store status, so this
+            # skips the per-row delete signals that invalidate store caches.
+            total += StoreStatus.objects.filter(pk__in=pks)._raw_delete(StoreStatus.objects.db)
+            self.stdout.write("Deleted %d statuses" % total)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Deleted %d statuses that expired before %s" % (total, cutoff)))
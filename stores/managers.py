@@ -1,7 +1,180 @@
-from django.contrib.gis.db.models import Manager
+from django.contrib.gis.db.models import Manager, PointField, QuerySet
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.db import connections
+from django.db.models import (
+    Case, DurationField, Exists, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When)
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+from oscar.core.loading import get_model
 
+from stores.cache import bump_store_versions
+from stores.functions import GeographyKNNDistance, IsoWeekDay, KNNDistance, TimeOfDay, WallTime
+from stores.vector_tiles import invalidate_tiles
 
-class StoreManager(Manager):
+
+class StoreQuerySet(QuerySet):
+
+    def with_current_status(self, now=None):
+        """
+        Annotates every store with its current status in a single query.
+
+        * ``within_opening_hours``: whether an opening period covers ``now``
+        * ``active_status``/``active_status_expires_at``: the latest active
+          StoreStatus, if any
+        * ``current_status``: one of the StoreStatus codes
+        * ``status_remaining_time``: time left on a busy/closed status
+        """
+        OpeningPeriod = get_model('stores', 'OpeningPeriod')
+        StoreStatus = get_model('stores', 'StoreStatus')
+
+        now = now or timezone.now()
+
+        # Opening periods are in each store's own time zone
+        wall_time = WallTime(
+            Coalesce(NullIf(OuterRef('time_zone'), Value('')),
+                     Value(timezone.get_default_timezone_name())),
+            Value(now),
+        )
+        current_time = TimeOfDay(wall_time)
+
+        # Mirrors WeeklySchedule.from_periods: a missing bound covers the rest
+        # of the day, but a period without either bound is a closed day.
+        open_periods = OpeningPeriod.objects.filter(
+            Q(start__lte=current_time) | Q(start__isnull=True, end__isnull=False),
+            Q(end__gte=current_time) | Q(end__isnull=True, start__isnull=False),
+            store=OuterRef('pk'),
+            weekday=IsoWeekDay(wall_time),
+        )
+        active_statuses = StoreStatus.objects.filter(
+            store=OuterRef('pk'),
+            set_at__lte=now,
+            expires_at__gte=now,
+        ).order_by('-set_at')
+
+        overriding = [StoreStatus.StatusChoices.BUSY, StoreStatus.StatusChoices.CLOSED]
+        return self.annotate(
+            within_opening_hours=Exists(open_periods),
+            active_status=Subquery(active_statuses.values('status')[:1]),
+            active_status_expires_at=Subquery(active_statuses.values('expires_at')[:1]),
+        ).annotate(
+            current_status=Case(
+                When(within_opening_hours=False, then=Value(StoreStatus.StatusChoices.CLOSED)),
+                When(active_status__in=overriding, then=F('active_status')),
+                default=Value(StoreStatus.StatusChoices.OPEN),
+            ),
+            status_remaining_time=Case(
+                When(
+                    within_opening_hours=True,
+                    active_status__in=overriding,
+                    then=ExpressionWrapper(
+                        F('active_status_expires_at') - Value(now),
+                        output_field=DurationField(),
+                    ),
+                ),
+                default=None,
+                output_field=DurationField(),
+            ),
+        )
+
+    def open_now(self, now=None):
+        """
+        Filters down to the stores that are open at ``now``: within an
+        opening period and not overridden by an active busy/closed status.
+        """
+        StoreStatus = get_model('stores', 'StoreStatus')
+        return self.with_current_status(now).filter(current_status=StoreStatus.StatusChoices.OPEN)
+
+    def order_by_nearest(self, point):
+        """
+        Orders the stores nearest to ``point`` first with PostGIS's ``<->``
+        operator, so the spatial index returns them without computing every
+        distance.  Geodetic locations are compared as geography, in metres,
+        using the same index as within_distance(): planar distances in
+        degrees would rank stores east or west of ``point`` as nearer than
+        they are.
+        """
+        field = self.model._meta.get_field('location')
+        if not field.geodetic(connections[self.db]):
+            return self.order_by(KNNDistance('location', point))
+
+        geography = PointField(geography=True, srid=field.srid)
+        return self.alias(
+            location_geography=Cast('location', geography),
+        ).order_by(GeographyKNNDistance(
+            F('location_geography'),
+            Cast(Value(point, output_field=PointField(srid=point.srid or field.srid)), geography)))
+
+    def within_distance(self, point, distance):
+        """
+        Filters down to the stores within ``distance`` of ``point`` using
+        ST_DWithin, which can use a spatial index, rather than comparing a
+        computed distance for every row.
+        """
+        field = self.model._meta.get_field('location')
+        if not field.geodetic(connections[self.db]):
+            return self.filter(location__dwithin=(point, distance))
+
+        # Distances can't be expressed in degrees, so geodetic locations are
+        # compared as geography, in metres.  The cast matches the expression
+        # of the store's geography index.
+        return self.alias(
+            location_geography=Cast('location', PointField(geography=True, srid=field.srid)),
+        ).filter(location_geography__dwithin=(point, distance))
+
+    def within_bbox(self, bbox):
+        """
+        Filters down to the stores within a ``(min_lng, min_lat, max_lng,
+        max_lat)`` box, using the spatial index.  Boxes crossing the
+        antimeridian, with ``min_lng`` greater than ``max_lng``, are split in
+        two.
+        """
+        srid = self.model._meta.get_field('location').srid
+        min_lng, min_lat, max_lng, max_lat = bbox
+        if min_lng <= max_lng:
+            envelope = Polygon.from_bbox(bbox)
+        else:
+            envelope = MultiPolygon(
+                Polygon.from_bbox((min_lng, min_lat, 180, max_lat)),
+                Polygon.from_bbox((-180, min_lat, max_lng, max_lat)))
+        envelope.srid = srid
+        return self.filter(location__within=envelope)
+
+    def serving(self, point):
+        """
+        Filters down to the active stores whose service area contains
+        ``point``, nearest first.  The containment test uses the service
+        area's spatial index.  Chain ``open_now()`` to only get the stores
+        serving the point right now.
+        """
+        return (
+            self.filter(is_active=True, service_area__contains=point)
+            .annotate(distance=Distance('location', point))
+            .order_by('distance', 'pk'))
+
+    def set_status(self, status, duration=None):
+        """
+        Sets ``status`` on every store in the queryset, e.g. to mark all of a
+        vendor's branches busy.  The statuses are written with a single
+        ``bulk_create`` and the stores' caches and map tiles invalidated in
+        one go.
+        """
+        StoreStatus = get_model('stores', 'StoreStatus')
+
+        set_at = timezone.now()
+        expires_at = StoreStatus.get_expires_at(set_at, duration)
+        stores = dict(self.values_list('pk', 'location'))
+        statuses = StoreStatus.objects.bulk_create([
+            StoreStatus(store_id=pk, status=status, duration=duration,
+                        set_at=set_at, expires_at=expires_at)
+            for pk in stores
+        ])
+        bump_store_versions(stores, directory=False)
+        invalidate_tiles(stores.values())
+        return statuses
+
+
+class StoreManager(Manager.from_queryset(StoreQuerySet)):
 
     def pickup_stores(self):
         return self.get_queryset().filter(is_drive_thru=True, is_active=True)
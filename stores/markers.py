@@ -0,0 +1,64 @@
+"""
+A compact JSON payload of every active store for map markers and the store
+directory, cached under the store directory version and the language.  Pages
+don't embed it: scripts fetch it from ``stores:markers``, which browsers
+revalidate by ETag.
+"""
+import json
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.translation import get_language
+from oscar.core.loading import get_model
+
+from stores.cache import get_directory_version
+from stores.functions import PointX, PointY
+from stores.utils import get_markers_cache_timeout
+
+
+def build_markers():
+    Store = get_model('stores', 'Store')
+    rows = (
+        Store.objects.filter(is_active=True)
+        .annotate(lng=PointX('location'), lat=PointY('location'))
+        .values_list('pk', 'name', 'slug', 'lng', 'lat', 'group__name')
+        .order_by('name', 'pk'))
+    return [{
+        'id': pk,
+        'name': name,
+        'lat': round(lat, 6),
+        'lng': round(lng, 6),
+        'group': group,
+        'url': reverse('stores:detail', kwargs={'dummyslug': slug, 'pk': pk}),
+    } for pk, name, slug, lng, lat, group in rows.iterator(chunk_size=2000)]
+
+
+def get_markers_etag(language=None):
+    return '"%s-%s"' % (get_directory_version(), language or get_language())
+
+
+def get_markers_json(language=None):
+    """
+    Returns the markers of every active store as a JSON array, rebuilding
+    it when any store has changed since it was cached
+    """
+    language = language or get_language()
+    key = f'store_markers_{get_directory_version()}_{language}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = json.dumps(build_markers(), separators=(',', ':'))
+        cache.set(key, payload, timeout=get_markers_cache_timeout())
+    return payload
+
+
+def has_markers():
+    """
+    Returns whether there are any active stores, cached like the markers
+    """
+    Store = get_model('stores', 'Store')
+    key = f'store_markers_exist_{get_directory_version()}'
+    exists = cache.get(key)
+    if exists is None:
+        exists = Store.objects.filter(is_active=True).exists()
+        cache.set(key, exists, timeout=get_markers_cache_timeout())
+    return exists
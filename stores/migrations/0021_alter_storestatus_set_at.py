@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0020_alter_store_total_ratings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storestatus',
+            name='set_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0021_alter_storestatus_set_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='storestatus',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False)), fields=['store', 'expires_at', 'set_at'], include=('status',), name='stores_status_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storestatus',
+            index=models.Index(fields=['expires_at'], name='stores_status_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:05
+
+import stores.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0022_storestatus_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='time_zone',
+            field=models.CharField(blank=True, default='', help_text="Time zone of the opening hours, e.g. Asia/Riyadh. Leave empty to use the site's time zone.", max_length=63, validators=[stores.utils.validate_time_zone], verbose_name='Time zone'),
+        ),
+    ]
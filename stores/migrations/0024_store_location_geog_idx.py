@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:40
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0023_store_time_zone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='store',
+            index=django.contrib.postgres.indexes.GistIndex(django.db.models.functions.comparison.Cast('location', django.contrib.gis.db.models.fields.PointField(geography=True, srid=4326)), name='stores_store_location_geog_idx'),
+        ),
+    ]
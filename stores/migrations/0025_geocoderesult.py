@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:20
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0024_store_location_geog_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoCodeResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255, unique=True, verbose_name='Normalised query')),
+                ('location', django.contrib.gis.db.models.fields.PointField(blank=True, null=True, srid=4326, verbose_name='Location')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+            ],
+            options={
+                'verbose_name': 'Geocode result',
+                'verbose_name_plural': 'Geocode results',
+                'abstract': False,
+            },
+        ),
+    ]
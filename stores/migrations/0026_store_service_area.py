@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:10
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0025_geocoderesult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='service_area',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, help_text='Area the store delivers to or serves', null=True, srid=4326, verbose_name='Service area'),
+        ),
+    ]
@@ -1,7 +1,12 @@
 from oscar.core.loading import is_model_registered
 from auditlog.registry import auditlog
+from django.contrib.gis.db.models import PointField
+from django.contrib.postgres.indexes import GistIndex
+from django.db.models.functions import Cast
 from django.utils.translation import gettext_lazy as _
 
+from stores.utils import get_geodetic_srid
+
 from . import abstract_models
 
 __all__ = []
@@ -29,6 +34,14 @@ if not is_model_registered('stores', 'Store'):
             verbose_name = _("Branch")
             verbose_name_plural = _("Branches")
             app_label = 'stores'
+            indexes = [
+                # Backs radius searches on geodetic locations, see
+                # StoreQuerySet.within_distance()
+                GistIndex(
+                    Cast('location', PointField(geography=True, srid=get_geodetic_srid())),
+                    name='stores_store_location_geog_idx',
+                ),
+            ]
 
     __all__.append('Store')
 
@@ -47,6 +60,13 @@ if not is_model_registered('stores', 'StoreRating'):
     __all__.append('StoreRating')
 
 
+if not is_model_registered('stores', 'GeoCodeResult'):
+    class GeoCodeResult(abstract_models.GeoCodeResult):
+        pass
+
+    __all__.append('GeoCodeResult')
+
+
 # if not is_model_registered('stores', 'StoreStock'):
 #     class StoreStock(abstract_models.StoreStock):
 #         pass
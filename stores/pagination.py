@@ -0,0 +1,80 @@
+"""
+Keyset ("cursor") pagination.
+
+Rather than an OFFSET, which makes the database walk every earlier row, a
+page starts after the ordering values of the last row of the page before.
+Those values are handed to clients as an opaque cursor.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised for a cursor that doesn't encode a position in the current
+    ordering
+    """
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the values encoded in ``cursor``, raising ``ValueError`` if it
+    isn't one
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+    if not isinstance(values, list):
+        raise ValueError("Cursors encode a list")
+    return values
+
+
+def decode_keyset_cursor(cursor, first_type):
+    """
+    Return the ``[value, pk]`` pair encoded in ``cursor``, where ``value``
+    is an instance of ``first_type``, raising ``InvalidCursor`` otherwise
+    """
+    try:
+        values = decode_cursor(cursor)
+    except ValueError:
+        values = None
+    if (not values or len(values) != 2 or not isinstance(values[0], first_type)
+            or not isinstance(values[1], int)):
+        raise InvalidCursor(_("Invalid cursor"))
+    return values
+
+
+def keyset_filter(fields, values):
+    """
+    Return a Q matching rows ordered after ``values`` when ordering
+    ascending by ``fields``, i.e. ``(a, b) > (x, y)`` as
+    ``a > x OR (a = x AND b > y)``
+    """
+    condition = Q()
+    for index in reversed(range(len(fields))):
+        equal = {field: value for field, value in zip(fields[:index], values[:index])}
+        condition |= Q(**equal, **{f'{fields[index]}__gt': values[index]})
+    return condition
+
+
+def paginate_keyset(queryset, fields, cursor, page_size, get_values):
+    """
+    Return a page of ``queryset``, ordered by ``fields``, that starts after
+    ``cursor``, and the cursor of the following page or ``None``.
+    ``get_values`` maps a row to its values of ``fields``, as JSON types.
+    """
+    if cursor is not None:
+        queryset = queryset.filter(keyset_filter(fields, cursor))
+    rows = list(queryset.order_by(*fields)[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(get_values(rows[-1]))
+    return rows, None
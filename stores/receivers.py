@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save
+from oscar.core.loading import get_model
+
+from stores import cache, vector_tiles
+from stores.services import locator, service_areas
+from stores.utils import is_locator_enabled
+
+Store = get_model('stores', 'Store')
+OpeningPeriod = get_model('stores', 'OpeningPeriod')
+StoreAddress = get_model('stores', 'StoreAddress')
+StoreGroup = get_model('stores', 'StoreGroup')
+StoreRating = get_model('stores', 'StoreRating')
+StoreStatus = get_model('stores', 'StoreStatus')
+
+
+cache.register(Store, store_field=None)
+cache.register(OpeningPeriod)
+cache.register(StoreAddress)
+cache.register(StoreRating)
+cache.register(StoreStatus)
+
+# Markers carry their group's name
+post_save.connect(cache.invalidate_directory, sender=StoreGroup,
+                  dispatch_uid='stores_invalidate_directory')
+post_delete.connect(cache.invalidate_directory, sender=StoreGroup,
+                    dispatch_uid='stores_invalidate_directory')
+
+post_save.connect(vector_tiles.invalidate_store_tiles, sender=Store,
+                  dispatch_uid='stores_invalidate_store_tiles')
+post_delete.connect(vector_tiles.invalidate_store_tiles, sender=Store,
+                    dispatch_uid='stores_invalidate_store_tiles')
+# Tiles carry each store's current status
+post_save.connect(vector_tiles.invalidate_status_tiles, sender=StoreStatus,
+                  dispatch_uid='stores_invalidate_status_tiles')
+post_delete.connect(vector_tiles.invalidate_status_tiles, sender=StoreStatus,
+                    dispatch_uid='stores_invalidate_status_tiles')
+post_save.connect(service_areas.update_service_area_index, sender=Store,
+                  dispatch_uid='stores_update_service_area_index')
+post_delete.connect(service_areas.remove_from_service_area_index, sender=Store,
+                    dispatch_uid='stores_remove_from_service_area_index')
+
+if is_locator_enabled():
+    post_save.connect(locator.update_locator, sender=Store,
+                      dispatch_uid='stores_update_locator')
+    post_delete.connect(locator.remove_from_locator, sender=Store,
+                        dispatch_uid='stores_remove_from_locator')
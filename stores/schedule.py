@@ -0,0 +1,177 @@
+from bisect import bisect_right
+from datetime import datetime, time, timedelta, timezone
+
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+DAY_START = time(0, 0)
+DAY_END = time(23, 59, 59)
+
+
+def seconds_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def second_of_week(dt):
+    """
+    Offset of ``dt`` from Monday 00:00, in whole seconds of its wall time
+    """
+    return (dt.isoweekday() - 1) * SECONDS_PER_DAY + seconds_of_day(dt)
+
+
+def merge_intervals(intervals):
+    """
+    Sort ``(start, end)`` intervals, merging overlapping or adjacent ones, and
+    return their starts and ends as two tuples
+    """
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if starts and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return tuple(starts), tuple(ends)
+
+
+class WeeklySchedule:
+    """
+    A store's opening periods compiled into sorted, non-overlapping
+    second-of-week intervals.
+
+    Intervals are half-open ``[start, end)``.  Checking whether the store is
+    open at a given moment is a binary search over the interval starts and
+    doesn't touch the database.
+    """
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, intervals=()):
+        self.starts, self.ends = merge_intervals(intervals)
+
+    @classmethod
+    def from_periods(cls, periods):
+        intervals = []
+        for period in periods:
+            if period.start is None and period.end is None:
+                # An empty period is how a closed day is recorded
+                continue
+            start = seconds_of_day(period.start or DAY_START)
+            # Period ends are inclusive, so the interval stops a second later
+            end = seconds_of_day(period.end or DAY_END) + 1
+            if end <= start:
+                continue
+            offset = (period.weekday - 1) * SECONDS_PER_DAY
+            intervals.append((offset + start, offset + end))
+        return cls(intervals)
+
+    @property
+    def intervals(self):
+        return tuple(zip(self.starts, self.ends))
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def __eq__(self, other):
+        return isinstance(other, WeeklySchedule) and self.intervals == other.intervals
+
+    def __repr__(self):
+        return '<WeeklySchedule %r>' % (self.intervals,)
+
+    def _find(self, offset):
+        """
+        Return the index of the interval containing ``offset`` or ``None``
+        """
+        index = bisect_right(self.starts, offset) - 1
+        if index >= 0 and offset < self.ends[index]:
+            return index
+        return None
+
+    def is_open_at(self, dt):
+        return self._find(second_of_week(dt)) is not None
+
+    def next_transition(self, dt):
+        """
+        Return the next moment after ``dt`` at which the store opens or
+        closes, in the wall time of ``dt``, or ``None`` if it never opens.
+        """
+        if not self.starts:
+            return None
+        offset = second_of_week(dt)
+        index = self._find(offset)
+        if index is not None:
+            delta = self.ends[index] - offset
+        else:
+            following = bisect_right(self.starts, offset)
+            if following < len(self.starts):
+                delta = self.starts[following] - offset
+            else:
+                # Wrap around to the first opening of next week
+                delta = SECONDS_PER_WEEK - offset + self.starts[0]
+        return dt.replace(microsecond=0) + timedelta(seconds=delta)
+
+
+class UTCSchedule:
+    """
+    A WeeklySchedule laid out as UTC timestamps for a fixed span of time.
+
+    The span covers the week containing a given moment in the store's time
+    zone and the week after it, so DST changes are resolved once when the
+    schedule is built and checks only compare timestamps.  The schedule
+    should be rebuilt from ``valid_until``, the start of the second week.
+    """
+    __slots__ = ('starts', 'ends', 'valid_from', 'valid_until')
+
+    def __init__(self, starts, ends, valid_from, valid_until):
+        self.starts = starts
+        self.ends = ends
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+
+    @classmethod
+    def from_weekly(cls, schedule, tz, dt, weeks=2):
+        local = dt.astimezone(tz)
+        week_start = datetime.combine(local.date() - timedelta(days=local.isoweekday() - 1), time(0))
+
+        def timestamp(offset):
+            # Wall times are resolved by the time zone, including ambiguous
+            # and skipped times around DST changes
+            return (week_start + timedelta(seconds=offset)).replace(tzinfo=tz).timestamp()
+
+        intervals = [
+            (timestamp(week * SECONDS_PER_WEEK + start), timestamp(week * SECONDS_PER_WEEK + end))
+            for week in range(weeks)
+            for start, end in schedule.intervals
+        ]
+        starts, ends = merge_intervals(intervals)
+        return cls(starts, ends, timestamp(0), timestamp(SECONDS_PER_WEEK))
+
+    @property
+    def state(self):
+        return (self.starts, self.ends, self.valid_from, self.valid_until)
+
+    def covers(self, dt):
+        return self.valid_from <= dt.timestamp() < self.valid_until
+
+    def is_open_at(self, dt):
+        moment = dt.timestamp()
+        index = bisect_right(self.starts, moment) - 1
+        return index >= 0 and moment < self.ends[index]
+
+    def next_transition(self, dt):
+        """
+        Return the next moment after ``dt``, as an aware UTC datetime, at which
+        the store opens or closes or the schedule needs rebuilding.
+        """
+        moment = dt.timestamp()
+        index = bisect_right(self.starts, moment) - 1
+        if index >= 0 and moment < self.ends[index]:
+            transition = self.ends[index]
+        elif index + 1 < len(self.starts):
+            transition = self.starts[index + 1]
+        else:
+            transition = None
+        if transition is None or transition > self.valid_until:
+            if not self.starts:
+                return None
+            transition = self.valid_until
+        return datetime.fromtimestamp(transition, tz=timezone.utc)
@@ -0,0 +1,134 @@
+import csv
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.gis.db.models import Collect
+from django.contrib.gis.db.models.functions import Centroid
+from django.contrib.gis.geos import Point
+from oscar.core.loading import get_model
+
+from stores.abstract_models import DEFAULT_LOCATION
+from stores.utils import get_geodetic_srid
+
+
+def trigrams(value):
+    padded = '  %s ' % value
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Gazetteer:
+    """
+    In-memory index of place names to ``(lng, lat)`` centroids, for queries
+    that are only the name of a city, district or postcode.
+
+    Names are expected to be normalised with ``geocode.normalize_query``.
+    The whole query must name a place, optionally followed by one of
+    ``region_names``, such as the country.  Single word queries of at least
+    ``min_prefix_length`` characters are also matched to the only name
+    starting with them, and then to the most similar name by trigrams.  Anything else, such as a street address,
+    isn't resolved, so it can be passed on to a full geocoder.
+    """
+    similarity = 0.6
+    min_prefix_length = 3
+    region_names = ('saudi arabia', 'ksa', 'السعودية', 'المملكة العربية السعودية')
+
+    def __init__(self, places=(), region_names=None):
+        self.places = {}
+        for name, coords in places:
+            if name:
+                self.places.setdefault(name, coords)
+        if region_names is not None:
+            self.region_names = tuple(region_names)
+        self.names = sorted(self.places)
+        self.trigrams = defaultdict(set)
+        for name in self.names:
+            for trigram in trigrams(name):
+                self.trigrams[trigram].add(name)
+
+    def __len__(self):
+        return len(self.places)
+
+    def strip_region(self, query):
+        """
+        Returns ``query`` without a trailing region name, such as "riyadh"
+        for "riyadh saudi arabia"
+        """
+        for region in self.region_names:
+            if query.endswith(' ' + region):
+                return query[:-len(region) - 1]
+        return query
+
+    def lookup(self, query):
+        if not query:
+            return None
+        if query in self.places:
+            return self.places[query]
+
+        query = self.strip_region(query)
+        if query in self.places:
+            return self.places[query]
+
+        # Spelling variants are only tried for a single word, so that
+        # "riyadh olaya street 12" isn't mistaken for "riyadh"
+        if ' ' in query or len(query) < self.min_prefix_length:
+            return None
+
+        # "riyad" matches "riyadh" if nothing else starts with it
+        index = bisect_left(self.names, query)
+        matches = self.names[index:index + 2]
+        matches = [name for name in matches if name.startswith(query)]
+        if len(matches) == 1:
+            return self.places[matches[0]]
+
+        return self.lookup_similar(query)
+
+    def lookup_similar(self, query):
+        query_trigrams = trigrams(query)
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for name in self.trigrams.get(trigram, ()):
+                shared[name] += 1
+
+        best, best_score = None, self.similarity
+        for name, count in shared.items():
+            score = count / (len(query_trigrams) + len(trigrams(name)) - count)
+            if score >= best_score:
+                best, best_score = name, score
+        return self.places[best] if best is not None else None
+
+
+def get_city_places(normalize):
+    """
+    Yields the names of cities with stores, in every language they're
+    translated to, with the centroid of their active stores.  Stores still
+    at the default location haven't been geocoded, so they're left out.
+    """
+    City = get_model('user', 'City')
+    Store = get_model('stores', 'Store')
+
+    default_location = Point(DEFAULT_LOCATION.x, DEFAULT_LOCATION.y, srid=get_geodetic_srid())
+    centroids = dict(
+        Store.objects.filter(is_active=True, city__isnull=False)
+        .exclude(location__equals=default_location)
+        .values('city')
+        .annotate(centroid=Centroid(Collect('location')))
+        .values_list('city', 'centroid'))
+
+    name_fields = [field.attname for field in City._meta.concrete_fields
+                   if field.name == 'name' or field.name.startswith('name_')]
+    for city in City.objects.filter(pk__in=centroids).only('pk', *name_fields):
+        centroid = centroids[city.pk]
+        for field in name_fields:
+            name = getattr(city, field)
+            if name:
+                yield normalize(name), (centroid.x, centroid.y)
+
+
+def get_csv_places(path, normalize):
+    """
+    Yields places from a CSV file with ``name``, ``longitude`` and
+    ``latitude`` columns, such as postcodes and their centroids
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield normalize(row['name']), (float(row['longitude']), float(row['latitude']))
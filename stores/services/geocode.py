@@ -1,6 +1,27 @@
+import functools
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from oscar.core.loading import get_model
+from requests.adapters import HTTPAdapter
+
+from stores.services.gazetteer import Gazetteer, get_city_places, get_csv_places
+from stores.utils import (
+    get_geocode_backend, get_geocode_backoff, get_geocode_cache_timeout,
+    get_geocode_gazetteer_csv, get_geocode_lru_size, get_geocode_negative_cache_timeout,
+    get_geocode_pool_size, get_geocode_retries, get_geocode_timeout, get_geocode_url,
+    get_geodetic_srid, is_geocode_db_cache_enabled)
 
 
 class ServiceError(Exception):
@@ -11,6 +32,10 @@ class InvalidResponse(ServiceError):
     pass
 
 
+class ConnectionFailed(ServiceError):
+    pass
+
+
 class ZeroResuls(ServiceError):
     pass
 
@@ -44,19 +69,48 @@ def get_response_exception(status):
     return code_to_exception_map.get(status, UnknownError)
 
 
+@functools.lru_cache(maxsize=None)
+def get_session():
+    """
+    Returns the HTTP session shared by this process, so connections to the
+    geocoding API are pooled and kept alive
+    """
+    session = requests.Session()
+    pool_size = get_geocode_pool_size()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
 class BaseGeoCodeService:
     """
     Base class to geocode a search query.
     """
-    get = staticmethod(requests.get)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', get_geocode_timeout())
+        try:
+            return get_session().get(url, **kwargs)
+        except requests.RequestException as e:
+            raise ConnectionFailed(e) from e
 
     def geocode(self, query):
         return Point(0, 0)
 
+    async def ageocode(self, query):
+        # The pooled session is thread-safe, so concurrent lookups needn't
+        # queue up on the single thread-sensitive executor.  Subclasses that
+        # use the database override this to keep it on that executor.
+        return await sync_to_async(self.geocode, thread_sensitive=False)(query)
+
 
 class GeoCodeService(BaseGeoCodeService):
     """
-    Geocode a search query using Google's API
+    Geocode a search query using Google's API.
+
+    Requests that hit the API's rate limit are retried STORES_GEOCODE_RETRIES
+    times, waiting STORES_GEOCODE_BACKOFF seconds and doubling that each time.
     """
     def run_query(self, query):
         payload = {
@@ -64,7 +118,7 @@ class GeoCodeService(BaseGeoCodeService):
             'sensor': 'false',
             'key': settings.GOOGLE_MAPS_API_KEY,
         }
-        response = self.get('https://maps.googleapis.com/maps/api/geocode/json', params=payload)
+        response = self.get(get_geocode_url(), params=payload)
 
         if response.status_code != 200:
             raise InvalidResponse(response.status_code, response.content)
@@ -74,11 +128,277 @@ class GeoCodeService(BaseGeoCodeService):
         return data
 
     def geocode(self, query):
-        data = self.run_query(query)
+        retries = get_geocode_retries()
+        for attempt in range(retries + 1):
+            data = self.run_query(query)
+            if data['status'] != 'OVER_QUERY_LIMIT' or attempt == retries:
+                break
+            time.sleep(get_geocode_backoff() * 2 ** attempt)
 
         if not data['status'] == 'OK':
             errorcls = get_response_exception(data['status'])
             raise errorcls(data['status'])
 
         location = data['results'][0]['geometry']['location']
-        return Point(location['lng'], location['lat'])
+        return Point(location['lng'], location['lat'], srid=get_geodetic_srid())
+
+
+def normalize_query(query):
+    """
+    Fold case, punctuation and whitespace so that equivalent queries share
+    a cache entry
+    """
+    return ' '.join(re.sub(r'[\W_]+', ' ', query.casefold()).split())
+
+
+class LocalGeoCodeService(BaseGeoCodeService):
+    """
+    Geocode a search query against a gazetteer of the cities stores are in,
+    placed at the centroid of their stores, and the places listed in
+    STORES_GEOCODE_GAZETTEER_CSV.  Queries it can't resolve are passed on to
+    ``fallback``, an instance of ``fallback_class`` by default.  Subclasses
+    can set ``fallback_class`` to ``None`` to never leave the gazetteer.
+    """
+    fallback_class = GeoCodeService
+    _gazetteer = None
+    _gazetteer_lock = threading.Lock()
+
+    def __init__(self, fallback=None):
+        if fallback is None and self.fallback_class is not None:
+            fallback = self.fallback_class()
+        self.fallback = fallback
+
+    @classmethod
+    def get_gazetteer(cls):
+        with cls._gazetteer_lock:
+            if cls._gazetteer is None:
+                cls._gazetteer = cls.build_gazetteer()
+            return cls._gazetteer
+
+    @classmethod
+    def build_gazetteer(cls):
+        places = list(get_city_places(normalize_query))
+        path = get_geocode_gazetteer_csv()
+        if path:
+            places.extend(get_csv_places(path, normalize_query))
+        return Gazetteer(places)
+
+    @classmethod
+    def reset_gazetteer(cls):
+        with cls._gazetteer_lock:
+            cls._gazetteer = None
+
+    def lookup_gazetteer(self, gazetteer, query):
+        coords = gazetteer.lookup(normalize_query(query))
+        if coords is not None:
+            return Point(*coords, srid=get_geodetic_srid())
+        if self.fallback is None:
+            raise ZeroResuls('ZERO_RESULTS')
+        return None
+
+    def geocode(self, query):
+        point = self.lookup_gazetteer(self.get_gazetteer(), query)
+        if point is None:
+            point = self.fallback.geocode(query)
+        return point
+
+    async def ageocode(self, query):
+        # Building the gazetteer queries the stores, so only the fallback's
+        # request leaves the thread-sensitive executor
+        gazetteer = await sync_to_async(self.get_gazetteer)()
+        point = self.lookup_gazetteer(gazetteer, query)
+        if point is None:
+            point = await self.fallback.ageocode(query)
+        return point
+
+
+# Cached value of a query without results
+NO_RESULTS = ()
+
+
+class CachedGeoCodeService(BaseGeoCodeService):
+    """
+    Wraps a geocoder, by default the STORES_GEOCODE_BACKEND class, with an
+    in-process LRU, the Django cache and, when
+    STORES_GEOCODE_DB_CACHE is set, the GeoCodeResult table, looked up in
+    that order.
+
+    Cache entries are keyed on the normalised query, so equivalent queries
+    share them, but the wrapped geocoder gets the query as it was given.
+    Queries without results are cached too,
+    for STORES_GEOCODE_NEGATIVE_CACHE_TIMEOUT rather than
+    STORES_GEOCODE_CACHE_TIMEOUT.  Lookups are counted in ``stats`` by the
+    layer that answered them.
+    """
+    cache_prefix = 'stores_geocode'
+
+    def __init__(self, service=None, maxsize=None):
+        if service is None:
+            service = import_string(get_geocode_backend())()
+        self.service = service
+        self.maxsize = get_geocode_lru_size() if maxsize is None else maxsize
+        self.stats = Counter()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def geocode(self, query):
+        key = normalize_query(query)
+        if not key:
+            raise InvalidRequest('INVALID_REQUEST')
+
+        return self.to_point(self.lookup(key, query))
+
+    async def ageocode(self, query):
+        key = normalize_query(query)
+        if not key:
+            raise InvalidRequest('INVALID_REQUEST')
+
+        return self.to_point(await self.alookup(key, query))
+
+    def to_point(self, coords):
+        if coords == NO_RESULTS:
+            raise ZeroResuls('ZERO_RESULTS')
+        return Point(*coords, srid=get_geodetic_srid())
+
+    def lookup(self, key, query):
+        """
+        Returns the coordinates of ``query``, or NO_RESULTS, cached under its
+        normalised form ``key``.  Only the original query is sent upstream,
+        as normalising drops characters such as diacritics and house number
+        separators that the geocoder needs.
+        """
+        coords = self._get_memory(key)
+        if coords is not None:
+            self._count('memory_hits')
+            return coords
+
+        coords = self._get_stored(key)
+        if coords is None:
+            self._count('misses')
+            coords = self._geocode(query)
+            self._set_stored(key, coords)
+
+        self._set_memory(key, coords)
+        return coords
+
+    async def alookup(self, key, query):
+        """
+        Like ``lookup``, but awaits the wrapped geocoder's ``ageocode``.  The
+        cache and database are read and written on the thread-sensitive
+        executor, so only the upstream request runs off it.
+        """
+        coords = self._get_memory(key)
+        if coords is not None:
+            self._count('memory_hits')
+            return coords
+
+        coords = await sync_to_async(self._get_stored)(key)
+        if coords is None:
+            self._count('misses')
+            coords = await self._ageocode(query)
+            await sync_to_async(self._set_stored)(key, coords)
+
+        self._set_memory(key, coords)
+        return coords
+
+    def _get_stored(self, key):
+        coords = cache.get(self.get_cache_key(key))
+        if coords is not None:
+            self._count('cache_hits')
+            return coords
+
+        coords = self._get_db(key)
+        if coords is not None:
+            self._count('db_hits')
+            cache.set(self.get_cache_key(key), coords, self.get_timeout(coords))
+        return coords
+
+    def _set_stored(self, key, coords):
+        self._set_db(key, coords)
+        cache.set(self.get_cache_key(key), coords, self.get_timeout(coords))
+
+    def _geocode(self, query):
+        try:
+            point = self.service.geocode(query)
+        except ZeroResuls:
+            return NO_RESULTS
+        return (point.x, point.y)
+
+    async def _ageocode(self, query):
+        try:
+            point = await self.service.ageocode(query)
+        except ZeroResuls:
+            return NO_RESULTS
+        return (point.x, point.y)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get_cache_key(self, key):
+        return '%s:%s' % (self.cache_prefix, hashlib.md5(key.encode()).hexdigest())
+
+    def get_timeout(self, coords):
+        if coords == NO_RESULTS:
+            return get_geocode_negative_cache_timeout()
+        return get_geocode_cache_timeout()
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            expires, coords = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._lru[key]
+                return None
+            self._lru.move_to_end(key)
+            return coords
+
+    def _set_memory(self, key, coords):
+        if self.maxsize <= 0:
+            return
+        timeout = self.get_timeout(coords)
+        expires = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._lru[key] = (expires, coords)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self.stats.clear()
+
+    def _get_db(self, key):
+        if not is_geocode_db_cache_enabled():
+            return None
+        GeoCodeResult = get_model('stores', 'GeoCodeResult')
+        if len(key) > GeoCodeResult.QUERY_MAX_LENGTH:
+            return None
+        result = GeoCodeResult.objects.filter(query=key).first()
+        if result is None:
+            return None
+        coords = (result.location.x, result.location.y) if result.location else NO_RESULTS
+        timeout = self.get_timeout(coords)
+        if timeout is not None and result.updated_at < timezone.now() - timedelta(seconds=timeout):
+            return None
+        return coords
+
+    def _set_db(self, key, coords):
+        if not is_geocode_db_cache_enabled():
+            return
+        GeoCodeResult = get_model('stores', 'GeoCodeResult')
+        if len(key) > GeoCodeResult.QUERY_MAX_LENGTH:
+            return
+        location = Point(*coords, srid=get_geodetic_srid()) if coords else None
+        GeoCodeResult.objects.update_or_create(query=key, defaults={'location': location})
+
+
+@functools.lru_cache(maxsize=None)
+def get_service():
+    """
+    Returns the geocoder shared by this process
+    """
+    return CachedGeoCodeService()
@@ -0,0 +1,214 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.gis.measure import D
+from django.db.models import Case, IntegerField, Value, When
+from oscar.core.loading import get_model
+
+from stores.utils import get_locator_max_age
+
+EARTH_RADIUS = 6371008.8  # metres
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+HALF_CIRCUMFERENCE = math.pi * EARTH_RADIUS
+
+
+def haversine(lng1, lat1, lng2, lat2):
+    """
+    Great-circle distance in metres between two (lng, lat) points
+    """
+    lng1, lat1, lng2, lat2 = map(math.radians, (lng1, lat1, lng2, lat2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+
+def get_distance_in_metres(distance):
+    return distance.m if isinstance(distance, D) else float(distance)
+
+
+class StoreLocator:
+    """
+    In-memory grid index over the locations of active stores.
+
+    Stores are bucketed into cells of ``cell_size`` degrees.  Radius queries
+    only look at the cells overlapping the radius' bounding box, and nearest
+    queries widen the radius until enough stores are found, so neither goes
+    to the database.  Results are ``(pk, metres)`` pairs that can be turned
+    back into a queryset with :meth:`get_queryset`.
+    """
+
+    def __init__(self, cell_size=0.25):
+        self.cell_size = cell_size
+        self.columns = math.ceil(360 / cell_size)
+        self.built_at = None
+        self._lock = threading.RLock()
+        self._cells = defaultdict(dict)
+        self._stores = {}
+
+    def __len__(self):
+        return len(self._stores)
+
+    def get_cell(self, lng, lat):
+        return (math.floor((lng + 180) / self.cell_size) % self.columns,
+                math.floor((lat + 90) / self.cell_size))
+
+    def build(self, queryset=None):
+        Store = get_model('stores', 'Store')
+        if queryset is None:
+            queryset = Store.objects.filter(is_active=True)
+        rows = queryset.values_list('pk', 'location', 'group_id').iterator(chunk_size=5000)
+
+        cells, stores = defaultdict(dict), {}
+        for pk, location, group_id in rows:
+            entry = (location.x, location.y, group_id)
+            cell = self.get_cell(location.x, location.y)
+            cells[cell][pk] = entry
+            stores[pk] = cell
+
+        with self._lock:
+            self._cells, self._stores = cells, stores
+            self.built_at = time.monotonic()
+
+    def add(self, pk, lng, lat, group_id=None):
+        with self._lock:
+            self.remove(pk)
+            cell = self.get_cell(lng, lat)
+            self._cells[cell][pk] = (lng, lat, group_id)
+            self._stores[pk] = cell
+
+    def remove(self, pk):
+        with self._lock:
+            cell = self._stores.pop(pk, None)
+            if cell is not None:
+                del self._cells[cell][pk]
+                if not self._cells[cell]:
+                    del self._cells[cell]
+
+    def update_store(self, store):
+        if store.is_active and store.location is not None:
+            self.add(store.pk, store.location.x, store.location.y, store.group_id)
+        else:
+            self.remove(store.pk)
+
+    def _candidate_cells(self, lng, lat, metres):
+        lat_delta = metres / METRES_PER_DEGREE
+        min_row = math.floor((max(lat - lat_delta, -90) + 90) / self.cell_size)
+        max_row = math.floor((min(lat + lat_delta, 90) + 90) / self.cell_size)
+
+        # Longitude degrees shrink towards the poles, using the widest
+        # latitude of the box keeps the bounding box conservative
+        widest = max(abs(lat - lat_delta), abs(lat + lat_delta))
+        if widest >= 90 or lat_delta >= 90:
+            columns = range(self.columns)
+        else:
+            lng_delta = lat_delta / math.cos(math.radians(widest))
+            if lng_delta >= 180:
+                columns = range(self.columns)
+            else:
+                first = math.floor((lng - lng_delta + 180) / self.cell_size)
+                last = math.floor((lng + lng_delta + 180) / self.cell_size)
+                columns = [column % self.columns for column in range(first, last + 1)]
+
+        if len(columns) * (max_row - min_row + 1) > len(self._cells):
+            # Cheaper to check every occupied cell than every cell in the box
+            columns = set(columns)
+            return [cell for cell in self._cells
+                    if cell[0] in columns and min_row <= cell[1] <= max_row]
+        return [(column, row) for column in columns for row in range(min_row, max_row + 1)]
+
+    def within(self, point, distance, group=None):
+        """
+        Returns ``(pk, metres)`` for the stores within ``distance`` of
+        ``point``, nearest first
+        """
+        lng, lat = point.x, point.y
+        metres = get_distance_in_metres(distance)
+        group_id = getattr(group, 'pk', group)
+
+        results = []
+        with self._lock:
+            for cell in self._candidate_cells(lng, lat, metres):
+                for pk, (store_lng, store_lat, store_group_id) in self._cells.get(cell, {}).items():
+                    if group_id is not None and store_group_id != group_id:
+                        continue
+                    store_distance = haversine(lng, lat, store_lng, store_lat)
+                    if store_distance <= metres:
+                        results.append((pk, store_distance))
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def nearest(self, point, k=1, group=None, max_distance=None):
+        """
+        Returns ``(pk, metres)`` for the ``k`` stores nearest to ``point``
+        """
+        limit = HALF_CIRCUMFERENCE
+        if max_distance is not None:
+            limit = min(get_distance_in_metres(max_distance), limit)
+
+        # Every store within the radius is found, so once it holds k stores
+        # they are the k nearest overall
+        metres = min(self.cell_size * METRES_PER_DEGREE, limit)
+        while True:
+            results = self.within(point, metres, group=group)
+            if len(results) >= k or metres >= limit or len(results) == len(self):
+                return results[:k]
+            metres = min(metres * 4, limit)
+
+    def get_queryset(self, results, queryset=None):
+        """
+        Turns ``(pk, metres)`` results into a queryset in the same order
+        """
+        if queryset is None:
+            queryset = get_model('stores', 'Store').objects.all()
+        pks = [pk for pk, __ in results]
+        if not pks:
+            return queryset.none()
+        ordering = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(pks)],
+                        output_field=IntegerField())
+        return queryset.filter(pk__in=pks).order_by(ordering)
+
+    def nearest_stores(self, point, k=1, group=None, max_distance=None, queryset=None):
+        """
+        Returns the ``k`` nearest stores to ``point`` as model instances, with
+        their distance set as ``distance``
+        """
+        results = self.nearest(point, k, group=group, max_distance=max_distance)
+        distances = dict(results)
+        stores = list(self.get_queryset(results, queryset))
+        for store in stores:
+            store.distance = D(m=distances[store.pk])
+        return stores
+
+
+_locator = None
+_locator_lock = threading.Lock()
+
+
+def get_locator():
+    """
+    Returns this process's StoreLocator, (re)building it when it's older than
+    STORES_LOCATOR_MAX_AGE.  Saves and deletes of stores in this process are
+    applied straight away by signal receivers; the rebuild picks up changes
+    made elsewhere and by bulk updates.
+    """
+    global _locator
+    with _locator_lock:
+        if _locator is None:
+            _locator = StoreLocator()
+        max_age = get_locator_max_age()
+        if (_locator.built_at is None
+                or max_age is not None and time.monotonic() - _locator.built_at > max_age):
+            _locator.build()
+        return _locator
+
+
+def update_locator(sender, instance, **kwargs):
+    if _locator is not None:
+        _locator.update_store(instance)
+
+
+def remove_from_locator(sender, instance, **kwargs):
+    if _locator is not None:
+        _locator.remove(instance.pk)
@@ -0,0 +1,118 @@
+import threading
+import time
+
+from oscar.core.loading import get_model
+
+from stores.services.locator import get_distance_in_metres, haversine
+from stores.utils import get_service_area_max_age
+
+
+class ServiceAreaIndex:
+    """
+    In-memory index of the service areas of active stores, for finding the
+    stores that serve a point without a database query.
+
+    Each area is kept as a GEOS prepared geometry, which indexes its edges
+    so repeated containment tests are fast, and a bounding box that rules
+    out most areas before any geometry test.  Results are ``(pk, metres)``
+    pairs, nearest store location first.
+    """
+
+    def __init__(self):
+        self.built_at = None
+        self._lock = threading.RLock()
+        self._areas = {}
+
+    def __len__(self):
+        return len(self._areas)
+
+    def prepare(self, area, location, group_id):
+        prepared = area.prepared
+        # Prepared geometries build their edge index on first use.  Building
+        # it here means lookups from many threads only ever read it.
+        prepared.intersects(location)
+        return (area.extent, prepared, location.x, location.y, group_id)
+
+    def build(self, queryset=None):
+        Store = get_model('stores', 'Store')
+        if queryset is None:
+            queryset = Store.objects.filter(is_active=True)
+        rows = (queryset.filter(service_area__isnull=False)
+                .values_list('pk', 'service_area', 'location', 'group_id')
+                .iterator(chunk_size=500))
+        areas = {pk: self.prepare(area, location, group_id)
+                 for pk, area, location, group_id in rows}
+
+        with self._lock:
+            self._areas = areas
+            self.built_at = time.monotonic()
+
+    def update_store(self, store):
+        with self._lock:
+            if store.is_active and store.service_area:
+                self._areas[store.pk] = self.prepare(
+                    store.service_area, store.location, store.group_id)
+            else:
+                self._areas.pop(store.pk, None)
+
+    def remove(self, pk):
+        with self._lock:
+            self._areas.pop(pk, None)
+
+    def serving(self, point, group=None, max_distance=None):
+        """
+        Returns ``(pk, metres)`` for the stores whose area contains
+        ``point``, nearest first
+        """
+        lng, lat = point.x, point.y
+        group_id = getattr(group, 'pk', group)
+        limit = get_distance_in_metres(max_distance) if max_distance is not None else None
+
+        with self._lock:
+            areas = list(self._areas.items())
+
+        results = []
+        for pk, (extent, prepared, store_lng, store_lat, store_group_id) in areas:
+            min_x, min_y, max_x, max_y = extent
+            if not (min_x <= lng <= max_x and min_y <= lat <= max_y):
+                continue
+            if group_id is not None and store_group_id != group_id:
+                continue
+            if not prepared.contains(point):
+                continue
+            distance = haversine(lng, lat, store_lng, store_lat)
+            if limit is None or distance <= limit:
+                results.append((pk, distance))
+        results.sort(key=lambda result: (result[1], result[0]))
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_service_area_index():
+    """
+    Returns this process's ServiceAreaIndex, (re)building it when it's older
+    than STORES_SERVICE_AREA_MAX_AGE.  Saves and deletes of stores in this
+    process are applied straight away by signal receivers.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ServiceAreaIndex()
+        max_age = get_service_area_max_age()
+        if (_index.built_at is None
+                or max_age is not None and time.monotonic() - _index.built_at > max_age):
+            _index.build()
+        return _index
+
+
+def update_service_area_index(sender, instance, **kwargs):
+    if _index is not None:
+        _index.update_store(instance)
+
+
+def remove_from_service_area_index(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove(instance.pk)
@@ -6,8 +6,8 @@ var stores = (function(s, gmaps, o) {
                 s.maps.overview.initAutocomplete();
                 s.maps.overview.initGeoLocation();
 
-                // Submit form when a user selects a store type
-                $('[data-behaviours~=filter-group]').on('change', function () {
+                // Submit form when a user selects a store type or toggles "open now"
+                $('[data-behaviours~=filter-group], [data-behaviours~=filter-open-now]').on('change', function () {
                     $('#store-search').submit();
                 });
             },
@@ -80,9 +80,67 @@ var stores = (function(s, gmaps, o) {
                     map.fitBounds(bounds);
                 }
                 s.maps.overview.addStoreMarkers(map, bounds, stores);
+                s.maps.overview.initClusters(map, stores);
                 return map;
             },
 
+            // List every active store from the cached markers payload
+            initDirectory: function() {
+                var list = $('#store-directory'),
+                    url = list.data('markers-url');
+                if (!url) {
+                    return;
+                }
+                $.getJSON(url).done(function(markers) {
+                    list.empty();
+                    $.each(markers, function(index, marker) {
+                        list.append($('<li class="nav-item">').append(
+                            $('<a class="nav-link">').attr('href', marker.url).text(marker.name)));
+                    });
+                });
+            },
+
+            // Show every other store as server-side clusters of the visible
+            // tiles, reloaded whenever the map settles
+            initClusters: function(map, stores) {
+                var url = $('#store-map').data('clusters-url'),
+                    shown = {},
+                    clusterMarkers = [];
+                if (!url) {
+                    return;
+                }
+                $.each(stores, function(index, store) {
+                    shown[store.pk] = true;
+                });
+
+                gmaps.event.addListener(map, 'idle', function() {
+                    var bounds = map.getBounds(),
+                        sw = bounds.getSouthWest(),
+                        ne = bounds.getNorthEast();
+                    $.getJSON(url, {
+                        bbox: [sw.lng(), sw.lat(), ne.lng(), ne.lat()].join(','),
+                        zoom: map.getZoom(),
+                        group: $('#id_group').val() || ''
+                    }).done(function(data) {
+                        $.each(clusterMarkers, function(index, marker) {
+                            marker.setMap(null);
+                        });
+                        clusterMarkers = [];
+                        $.each(data.clusters, function(index, cluster) {
+                            if (cluster.pk && shown[cluster.pk]) {
+                                return;
+                            }
+                            clusterMarkers.push(new gmaps.Marker({
+                                position: new gmaps.LatLng(cluster.lat, cluster.lng),
+                                map: map,
+                                label: cluster.count > 1 ? String(cluster.count) : null,
+                                opacity: 0.6
+                            }));
+                        });
+                    });
+                });
+            },
+
             getStoreInfoHTML: function(store) {
                 var infoHTML;
 
@@ -2,6 +2,9 @@
 
 from django import template
 from datetime import timedelta
+from django.utils.safestring import mark_safe
+
+from stores.fragments import get_fragment
 
 register = template.Library()
 
@@ -35,3 +38,12 @@ def format_timedelta(td):
                 strings.append(f"{period_value} {period_name}{'s' if period_value != 1 else ''}")
 
     return ', '.join(strings)
+
+
+@register.simple_tag
+def store_fragment(store, name):
+    """
+    Renders a fragment of the store's templates, cached until the store
+    changes. See stores.fragments.
+    """
+    return mark_safe(get_fragment(store, name))
@@ -0,0 +1,65 @@
+"""
+Web Mercator (EPSG:3857) XYZ tile arithmetic, as used by web maps
+"""
+import math
+
+WEB_MERCATOR_SRID = 3857
+# Half the width of the world in Web Mercator metres
+ORIGIN = 20037508.342789244
+# Latitude at which Web Mercator's square world ends
+MAX_LATITUDE = 85.0511287798066
+MAX_ZOOM = 22
+
+
+def lnglat_to_tile(lng, lat, zoom):
+    """
+    Return the ``(x, y)`` of the tile containing a point at ``zoom``
+    """
+    n = 2 ** zoom
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = math.floor((lng + 180) / 360 * n)
+    y = math.floor((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom, x, y):
+    """
+    Return the ``(minx, miny, maxx, maxy)`` of a tile in Web Mercator metres
+    """
+    size = 2 * ORIGIN / 2 ** zoom
+    minx = -ORIGIN + x * size
+    maxy = ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def mercator_to_lnglat(mx, my):
+    return (mx / ORIGIN * 180,
+            math.degrees(math.atan(math.sinh(my / ORIGIN * math.pi))))
+
+
+def tile_lnglat_bounds(zoom, x, y, margin=0):
+    """
+    Return the ``(min_lng, min_lat, max_lng, max_lat)`` of a tile, grown by
+    ``margin`` times its size on every side
+    """
+    minx, miny, maxx, maxy = tile_bounds(zoom, x, y)
+    margin *= maxx - minx
+    min_lng, min_lat = mercator_to_lnglat(max(minx - margin, -ORIGIN), max(miny - margin, -ORIGIN))
+    max_lng, max_lat = mercator_to_lnglat(min(maxx + margin, ORIGIN), min(maxy + margin, ORIGIN))
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def tiles_for_bbox(bbox, zoom):
+    """
+    Return the ``(x, y)`` of every tile overlapping a
+    ``(min_lng, min_lat, max_lng, max_lat)`` box at ``zoom``.  Boxes
+    crossing the antimeridian have a ``min_lng`` greater than ``max_lng``.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    x0, y0 = lnglat_to_tile(min_lng, max_lat, zoom)
+    x1, y1 = lnglat_to_tile(max_lng, min_lat, zoom)
+    if x0 <= x1:
+        columns = list(range(x0, x1 + 1))
+    else:
+        columns = list(range(x0, 2 ** zoom)) + list(range(0, x1 + 1))
+    return [(x, y) for x in columns for y in range(y0, y1 + 1)]
@@ -1,4 +1,9 @@
+import math
+import zoneinfo
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
 
 
 def get_geographic_srid():
@@ -7,3 +12,119 @@ def get_geographic_srid():
 
 def get_geodetic_srid():
     return getattr(settings, 'STORES_GEODETIC_SRID', 4326)
+
+
+def get_status_cache_max_timeout():
+    return getattr(settings, 'STORES_STATUS_CACHE_MAX_TIMEOUT', 60 * 60 * 24)
+
+
+def get_status_cache_timeout(now, valid_until):
+    """
+    Return the number of seconds a store status computed at ``now`` stays
+    valid, given the next moment it can change (``None`` if it never does).
+    """
+    max_timeout = get_status_cache_max_timeout()
+    if valid_until is None:
+        return max_timeout
+    timeout = math.ceil((valid_until - now).total_seconds())
+    return min(max(timeout, 1), max_timeout)
+
+
+def get_status_retention_days():
+    return getattr(settings, 'STORES_STATUS_RETENTION_DAYS', 30)
+
+
+def is_locator_enabled():
+    return getattr(settings, 'STORES_LOCATOR_ENABLED', False)
+
+
+def get_locator_max_age():
+    return getattr(settings, 'STORES_LOCATOR_MAX_AGE', 300)
+
+
+def get_service_area_max_age():
+    return getattr(settings, 'STORES_SERVICE_AREA_MAX_AGE', 300)
+
+
+def get_geocode_cache_timeout():
+    return getattr(settings, 'STORES_GEOCODE_CACHE_TIMEOUT', 60 * 60 * 24 * 30)
+
+
+def get_geocode_negative_cache_timeout():
+    return getattr(settings, 'STORES_GEOCODE_NEGATIVE_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_geocode_lru_size():
+    return getattr(settings, 'STORES_GEOCODE_LRU_SIZE', 1024)
+
+
+def is_geocode_db_cache_enabled():
+    return getattr(settings, 'STORES_GEOCODE_DB_CACHE', False)
+
+
+def get_geocode_url():
+    return getattr(settings, 'STORES_GEOCODE_URL', 'https://maps.googleapis.com/maps/api/geocode/json')
+
+
+def get_geocode_timeout():
+    return getattr(settings, 'STORES_GEOCODE_TIMEOUT', (3.05, 10))
+
+
+def get_geocode_retries():
+    return getattr(settings, 'STORES_GEOCODE_RETRIES', 2)
+
+
+def get_geocode_backoff():
+    return getattr(settings, 'STORES_GEOCODE_BACKOFF', 0.5)
+
+
+def get_geocode_pool_size():
+    return getattr(settings, 'STORES_GEOCODE_POOL_SIZE', 10)
+
+
+def get_geocode_backend():
+    return getattr(settings, 'STORES_GEOCODE_BACKEND', 'stores.services.geocode.GeoCodeService')
+
+
+def get_geocode_gazetteer_csv():
+    return getattr(settings, 'STORES_GEOCODE_GAZETTEER_CSV', None)
+
+
+def get_cluster_grid_size():
+    return getattr(settings, 'STORES_CLUSTER_GRID_SIZE', 4)
+
+
+def get_markers_cache_timeout():
+    return getattr(settings, 'STORES_MARKERS_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def get_cluster_cache_timeout():
+    return getattr(settings, 'STORES_CLUSTER_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def get_cluster_max_tiles():
+    return getattr(settings, 'STORES_CLUSTER_MAX_TILES', 64)
+
+
+def get_tile_cache_timeout():
+    return getattr(settings, 'STORES_TILE_CACHE_TIMEOUT', 60 * 5)
+
+
+def get_fragment_cache_timeout():
+    return getattr(settings, 'STORES_FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def get_api_chunk_size():
+    return getattr(settings, 'STORES_API_CHUNK_SIZE', 2000)
+
+
+def get_api_nearest_limit():
+    return getattr(settings, 'STORES_API_NEAREST_LIMIT',
+                   getattr(settings, 'STORES_NEAREST_LIMIT', None))
+
+
+def validate_time_zone(value):
+    try:
+        zoneinfo.ZoneInfo(value)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(_("%(value)s is not a valid time zone"), params={'value': value})
@@ -0,0 +1,109 @@
+"""
+Mapbox Vector Tiles of active stores, rendered by PostGIS.
+
+Rendered tiles are cached under a version per tile.  Saving or deleting a
+store bumps the versions of the tiles containing its old and new location
+at every zoom level, and so does saving or deleting one of its statuses, or
+setting statuses with ``StoreQuerySet.set_status()``.  Bulk updates that
+skip signals, and statuses expiring or opening hours starting and ending,
+show up once the cache times out after STORES_TILE_CACHE_TIMEOUT.
+"""
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F
+from oscar.core.loading import get_model
+
+from stores.cache import new_version
+from stores.functions import AsMVTGeom
+from stores.tiles import MAX_ZOOM, WEB_MERCATOR_SRID, lnglat_to_tile, tile_lnglat_bounds
+from stores.utils import get_geodetic_srid, get_tile_cache_timeout
+
+LAYER_NAME = 'stores'
+EXTENT = 4096
+BUFFER = 64
+
+
+def render_tile(zoom, x, y):
+    """
+    Returns tile ``zoom``/``x``/``y`` as MVT bytes, with a ``stores`` layer
+    whose features carry the store's ``id``, ``group_slug``,
+    ``is_drive_thru`` and current ``status``
+    """
+    Store = get_model('stores', 'Store')
+
+    # Include the stores in the tile's buffer, so markers on the edge aren't
+    # cut off
+    bounds = tile_lnglat_bounds(zoom, x, y, margin=BUFFER / EXTENT)
+    queryset = (
+        Store.objects
+        .filter(is_active=True,
+                location__bboverlaps=Polygon.from_bbox(bounds, srid=get_geodetic_srid()))
+        .with_current_status()
+        .values(
+            'id', 'is_drive_thru',
+            group_slug=F('group__slug'),
+            status=F('current_status'),
+            geom=AsMVTGeom(Transform('location', WEB_MERCATOR_SRID), zoom, x, y,
+                           extent=EXTENT, buffer=BUFFER))
+        .order_by())
+
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT ST_AsMVT(tile, %%s, %%s, 'geom') FROM (%s) AS tile" % sql,
+            [LAYER_NAME, EXTENT, *params])
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b''
+
+
+def get_tile_version_key(zoom, x, y):
+    return f'store_tile_version_{zoom}_{x}_{y}'
+
+
+def get_tile(zoom, x, y):
+    """
+    Returns tile ``zoom``/``x``/``y`` from the cache, rendering it on a miss
+    """
+    timeout = get_tile_cache_timeout()
+    version_key = get_tile_version_key(zoom, x, y)
+    version = cache.get(version_key)
+    if version is None:
+        version = new_version()
+        if not cache.add(version_key, version, timeout=timeout):
+            version = cache.get(version_key, version)
+
+    key = f'store_tile_{zoom}_{x}_{y}_{version}'
+    tile = cache.get(key)
+    if tile is None:
+        tile = render_tile(zoom, x, y)
+        cache.set(key, tile, timeout=timeout)
+    return tile
+
+
+def invalidate_tiles(points):
+    """
+    Invalidate the cached tiles containing ``points`` at every zoom level, in
+    one round-trip
+    """
+    keys = {}
+    for point in points:
+        for zoom in range(MAX_ZOOM + 1):
+            x, y = lnglat_to_tile(point.x, point.y, zoom)
+            keys[get_tile_version_key(zoom, x, y)] = new_version()
+    if keys:
+        # Versions only need to outlive the tiles cached under them
+        cache.set_many(keys, timeout=get_tile_cache_timeout())
+
+
+def invalidate_store_tiles(sender, instance, **kwargs):
+    points = [instance.location, getattr(instance, '_loaded_location', None)]
+    invalidate_tiles([point for point in points if point is not None])
+    instance._loaded_location = instance.location
+
+
+def invalidate_status_tiles(sender, instance, **kwargs):
+    Store = get_model('stores', 'Store')
+    locations = Store.objects.filter(pk=instance.store_id).values_list('location', flat=True)
+    invalidate_tiles(list(locations))
@@ -1,9 +1,26 @@
+import json
+
 from django.conf import settings
 from django.contrib.gis.db.models.functions import Distance
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
 from django.views import generic
+from django.views.decorators.http import condition
 from oscar.core.loading import get_class, get_model
-from .forms import StoreSearchForm
+from .clusters import get_clusters
+from .forms import StoreClusterForm, StoreSearchForm, StoreViewportForm
+from .fragments import prefetch_fragments
+from .functions import PointX, PointY
+from .markers import get_markers_etag, get_markers_json, has_markers
+from .pagination import InvalidCursor, decode_keyset_cursor, paginate_keyset
+from .status import prefetch_current_status
+from .tiles import MAX_ZOOM
+from .utils import get_api_chunk_size, get_api_nearest_limit, get_tile_cache_timeout
+from .vector_tiles import get_tile
 # StoreSearchForm = get_class('stores.forms', 'StoreSearchForm')
 Store = get_model('stores', 'store')
 
@@ -22,13 +39,24 @@ class StoreListView(MapsContextMixin, generic.ListView):
     context_object_name = 'store_list'
     form_class = StoreSearchForm
     title_template = "%(store_type)s %(filter)s"
+    # Everything the store cards render, loaded for a whole page at once
+    page_select_related = ('address', 'group', 'city')
+    page_prefetch_related = ('opening_periods',)
 
     def get(self, request, *args, **kwargs):
-        if self.is_form_submitted(request):
-            self.form = self.form_class(data=request.GET)
-        else:
-            self.form = self.form_class()
-        return super().get(request, *args, **kwargs)
+        self.form = self.get_form()
+        try:
+            return super().get(request, *args, **kwargs)
+        except InvalidCursor as e:
+            return self.invalid_cursor(e)
+
+    def invalid_cursor(self, error):
+        raise Http404(_("Invalid page"))
+
+    def get_form(self):
+        if self.is_form_submitted(self.request):
+            return self.form_class(data=self.request.GET)
+        return self.form_class()
 
     def is_form_submitted(self, request):
         return 'query' in request.GET
@@ -37,6 +65,43 @@ class StoreListView(MapsContextMixin, generic.ListView):
         """ Return max search distance when searching for stores """
         return getattr(settings, 'STORES_MAX_SEARCH_DISTANCE', None)
 
+    def get_nearest_limit(self):
+        """ Return how many of the nearest stores a search is limited to """
+        return getattr(settings, 'STORES_NEAREST_LIMIT', None)
+
+    def get_page_size(self):
+        """ Return how many stores are shown per page """
+        return getattr(settings, 'STORES_PAGE_SIZE', 20)
+
+    def get_keyset(self):
+        """
+        Return the fields the stores are ordered and paginated by, and a
+        function returning a store's values of them
+        """
+        if getattr(self.form, 'point', None):
+            return ['distance', 'pk'], lambda store: [store.distance.m, store.pk]
+        return ['name', 'pk'], lambda store: [store.name, store.pk]
+
+    def get_cursor(self, fields):
+        cursor = self.request.GET.get('cursor')
+        if not cursor:
+            return None
+        value_type = (int, float) if fields[0] == 'distance' else str
+        return decode_keyset_cursor(cursor, value_type)
+
+    def paginate_stores(self, queryset):
+        """
+        Return a page of stores starting after the ``cursor`` parameter and
+        the cursor of the next page, or ``None``.  Pages are keyed on the
+        ordering values of their last store rather than an offset, so later
+        pages cost the same as the first.
+        """
+        fields, get_values = self.get_keyset()
+        queryset = (queryset.select_related(*self.page_select_related)
+                    .prefetch_related(*self.page_prefetch_related))
+        return paginate_keyset(
+            queryset, fields, self.get_cursor(fields), self.get_page_size(), get_values)
+
     def get_queryset(self):
         queryset = self.model.objects.filter(is_active=True)
         if not self.form.is_valid():
@@ -48,15 +113,25 @@ class StoreListView(MapsContextMixin, generic.ListView):
         if group:
             queryset = queryset.filter(group=group)
 
+        if data.get('open_now'):
+            queryset = queryset.open_now()
+
         latlng = self.form.point
 
         if latlng:
-            queryset = queryset.annotate(distance=Distance('location', latlng))
+            nearest_limit = self.get_nearest_limit()
+            if nearest_limit:
+                # The spatial index picks the nearest candidates, so the exact
+                # distance below is only computed for those
+                candidates = queryset.order_by_nearest(latlng).values('pk')
+                queryset = queryset.filter(pk__in=candidates[:nearest_limit])
 
             # Constrain by distance if set up
             max_distance = self.get_max_distance()
             if max_distance:
-                queryset = queryset.filter(distance__lte=max_distance)
+                queryset = queryset.within_distance(latlng, max_distance)
+
+            queryset = queryset.annotate(distance=Distance('location', latlng))
 
             # Order by distance
             queryset = queryset.order_by('distance')
@@ -88,10 +163,20 @@ class StoreListView(MapsContextMixin, generic.ListView):
         return _(self.title_template) % title_kwargs
 
     def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
+        page, next_cursor = self.paginate_stores(self.object_list)
+        ctx = super().get_context_data(object_list=page, **kwargs)
+
+        prefetch_current_status(ctx['store_list'])
+        prefetch_fragments(ctx['store_list'], 'card')
+
+        ctx['next_cursor'] = next_cursor
+        if next_cursor:
+            params = self.request.GET.copy()
+            params['cursor'] = next_cursor
+            ctx['next_page_url'] = '?' + params.urlencode()
 
         ctx['form'] = self.form
-        ctx['all_stores'] = self.model.objects.select_related('group', 'address').all()
+        ctx['has_stores'] = has_markers()
 
         if hasattr(self.form, 'point') and self.form.point:
             coords = self.form.point.coords
@@ -103,7 +188,278 @@ class StoreListView(MapsContextMixin, generic.ListView):
         return ctx
 
 
+class StoreListPageView(StoreListView):
+    """
+    A page of the store list as JSON, with the cursor of the next page, for
+    infinite scrolling
+    """
+
+    def invalid_cursor(self, error):
+        return JsonResponse({'errors': {'cursor': [str(error)]}}, status=400)
+
+    def get_context_data(self, **kwargs):
+        page, next_cursor = self.paginate_stores(self.object_list)
+        prefetch_current_status(page)
+        return {'store_list': page, 'next_cursor': next_cursor}
+
+    def get_store_data(self, store):
+        data = {
+            'pk': store.pk,
+            'name': store.name,
+            'url': store.get_absolute_url(),
+            'lat': store.location.y,
+            'lng': store.location.x,
+            'is_open': store.is_open,
+        }
+        if getattr(store, 'distance', None) is not None:
+            data['distance_km'] = round(store.distance.km, 2)
+        return data
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse({
+            'results': [self.get_store_data(store) for store in context['store_list']],
+            'next': context['next_cursor'],
+        })
+
+
 class StoreDetailView(MapsContextMixin, generic.DetailView):
     model = Store
     template_name = 'stores/detail.html'
     context_object_name = 'store'
+
+
+class StoreClusterView(generic.View):
+    """
+    Returns the active stores within a bounding box at a zoom level as JSON
+    markers, aggregated per map tile into a grid of clusters
+    """
+    form_class = StoreClusterForm
+
+    def get(self, request, *args, **kwargs):
+        form = self.form_class(data=request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        data = form.cleaned_data
+        clusters = get_clusters(form.tiles, data['zoom'], group=data.get('group'))
+        return JsonResponse({'zoom': data['zoom'], 'clusters': clusters})
+
+
+class StoreTileView(generic.View):
+    """
+    Returns the active stores in an XYZ map tile as a Mapbox Vector Tile,
+    cacheable by browsers and CDNs for STORES_TILE_CACHE_TIMEOUT
+    """
+    content_type = 'application/vnd.mapbox-vector-tile'
+
+    def get(self, request, zoom, x, y, *args, **kwargs):
+        if zoom > MAX_ZOOM or x >= 2 ** zoom or y >= 2 ** zoom:
+            raise Http404
+        response = HttpResponse(get_tile(zoom, x, y), content_type=self.content_type)
+        patch_cache_control(response, public=True, max_age=get_tile_cache_timeout())
+        return response
+
+
+class StoreViewportView(generic.View):
+    """
+    Returns the active stores within a map viewport as compact JSON records,
+    nearest to its centre first.  Pages are keyed on the distance and pk of
+    their last store, so later pages cost the same as the first.
+    """
+    form_class = StoreViewportForm
+    page_size = 100
+
+    def get(self, request, *args, **kwargs):
+        form = self.form_class(data=request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        data = form.cleaned_data
+        queryset = Store.objects.filter(is_active=True).within_bbox(data['bbox'])
+        if data.get('group'):
+            queryset = queryset.filter(group=data['group'])
+        if data.get('open_now'):
+            queryset = queryset.open_now()
+        else:
+            queryset = queryset.with_current_status()
+
+        queryset = queryset.annotate(
+            distance=Distance('location', form.get_centre()),
+            lng=PointX('location'),
+            lat=PointY('location'),
+        ).values('pk', 'name', 'lng', 'lat', 'distance', 'current_status')
+
+        rows, cursor = paginate_keyset(
+            queryset, ['distance', 'pk'], data['cursor'], data.get('limit') or self.page_size,
+            lambda row: [row['distance'].m, row['pk']])
+
+        results = [{
+            'pk': row['pk'],
+            'name': row['name'],
+            'lat': round(row['lat'], 6),
+            'lng': round(row['lng'], 6),
+            'status': row['current_status'],
+        } for row in rows]
+        return JsonResponse({'results': results, 'next': cursor})
+
+
+@method_decorator(condition(etag_func=lambda request, *args, **kwargs: get_markers_etag()),
+                  name='get')
+class StoreMarkersView(generic.View):
+    """
+    Returns the markers of every active store as JSON.  The ETag is the
+    store directory version, so unchanged payloads are answered with a 304
+    without being loaded.
+    """
+
+    def get(self, request, *args, **kwargs):
+        response = HttpResponse(get_markers_json(), content_type='application/json')
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class StoreApiMixin:
+    """
+    Serialises stores as JSON from ``values()`` projections, so no model
+    instances are built.  The ``fields`` parameter, a comma separated list
+    of ``api_fields``, trims the payload.
+    """
+    # Field name -> model field or expression it's projected from
+    api_fields = {
+        'id': 'id',
+        'name': 'name',
+        'slug': 'slug',
+        'lat': PointY('location'),
+        'lng': PointX('location'),
+        'group': F('group__slug'),
+        'city': F('city__name'),
+        'address_line1': F('address__line1'),
+        'address_line2': F('address__line2'),
+        'address_line3': F('address__line3'),
+        'address_line4': F('address__line4'),
+        'postcode': F('address__postcode'),
+        'phone': 'phone',
+        'email': 'email',
+        'manager_name': 'manager_name',
+        'reference': 'reference',
+        'is_main': 'is_main',
+        'is_drive_thru': 'is_drive_thru',
+        'minimum_order_value': 'minimum_order_value',
+        'preparing_time': 'preparing_time',
+        'rating': 'rating',
+        'total_ratings': 'total_ratings',
+        'status': 'current_status',
+    }
+
+    def get_fields(self):
+        """
+        Return the requested field names, or raise ValueError naming the
+        unknown ones
+        """
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return list(self.api_fields)
+        fields = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+        unknown = [field for field in fields if field not in self.api_fields]
+        if unknown:
+            raise ValueError(_("Unknown fields: %s") % ', '.join(unknown))
+        return fields
+
+    def project(self, queryset, fields):
+        """
+        Return ``queryset`` as dicts of ``fields``, prefixed with ``_`` so
+        that the names can't clash with the model's own fields
+        """
+        if 'status' in fields and 'current_status' not in queryset.query.annotations:
+            queryset = queryset.with_current_status()
+        projection = {}
+        for field in fields:
+            source = self.api_fields[field]
+            projection[f'_{field}'] = F(source) if isinstance(source, str) else source
+        if 'distance' in queryset.query.annotations:
+            projection['_distance'] = F('distance')
+        return queryset.values(**projection)
+
+    def get_store_data(self, row):
+        data = {key[1:]: value for key, value in row.items()}
+        if 'lat' in data:
+            data['lat'] = round(data['lat'], 6)
+        if 'lng' in data:
+            data['lng'] = round(data['lng'], 6)
+        if data.get('distance') is not None:
+            data['distance'] = round(data['distance'].m, 1)
+        return data
+
+    def encode(self, data):
+        return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+class StoreApiListView(StoreApiMixin, StoreListView):
+    """
+    Streams the active stores as JSON, nearest first when searching by
+    location and by name otherwise.  Rows are read from a server-side cursor
+    STORES_API_CHUNK_SIZE at a time, so exporting every store doesn't load
+    them all into memory.
+    """
+
+    def is_form_submitted(self, request):
+        return any(name in request.GET for name in self.form_class.base_fields)
+
+    def get(self, request, *args, **kwargs):
+        self.form = self.get_form()
+        if self.form.is_bound and not self.form.is_valid():
+            return JsonResponse({'errors': self.form.errors}, status=400)
+        try:
+            fields = self.get_fields()
+        except ValueError as e:
+            return JsonResponse({'errors': {'fields': [str(e)]}}, status=400)
+
+        queryset = self.get_queryset()
+        if not getattr(self.form, 'point', None):
+            queryset = queryset.order_by('name', 'pk')
+        rows = self.project(queryset, fields).iterator(chunk_size=get_api_chunk_size())
+        return StreamingHttpResponse(self.stream(rows), content_type='application/json')
+
+    def stream(self, rows):
+        yield '{"results":['
+        separator = ''
+        for row in rows:
+            yield separator + self.encode(self.get_store_data(row))
+            separator = ','
+        yield ']}'
+
+
+class StoreApiSearchView(StoreApiListView):
+    """
+    Streams the active stores nearest to a ``query``, or to a ``latitude``
+    and ``longitude``, as JSON
+    """
+
+    def get_nearest_limit(self):
+        """ Return how many of the nearest stores an API search is limited to """
+        return get_api_nearest_limit()
+
+    def get(self, request, *args, **kwargs):
+        if not any(request.GET.get(name) for name in ('query', 'latitude', 'longitude')):
+            return JsonResponse({'errors': {'query': [
+                str(_("Enter an address, or a latitude and longitude, to search from"))]}},
+                status=400)
+        return super().get(request, *args, **kwargs)
+
+
+class StoreApiDetailView(StoreApiMixin, generic.View):
+    """
+    Returns an active store as JSON
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            fields = self.get_fields()
+        except ValueError as e:
+            return JsonResponse({'errors': {'fields': [str(e)]}}, status=400)
+
+        queryset = Store.objects.filter(is_active=True, pk=pk)
+        row = self.project(queryset, fields).first()
+        if row is None:
+            raise Http404(_("No store found"))
+        return HttpResponse(self.encode(self.get_store_data(row)), content_type='application/json')
@@ -1,6 +1,14 @@
 import factory
 from oscar.core.loading import get_model
-from oscar.test.factories import CountryFactory
+from oscar.test.factories import CountryFactory, UserFactory
+
+
+class VendorFactory(factory.django.DjangoModelFactory):
+    name = factory.Sequence(lambda n: 'Vendor %d' % n)
+    user = factory.SubFactory(UserFactory)
+
+    class Meta:
+        model = get_model('vendor', 'Vendor')
 
 
 class StoreFactory(factory.django.DjangoModelFactory):
@@ -25,3 +33,15 @@ class StoreStockFactory(factory.django.DjangoModelFactory):
 
     class Meta:
         model = get_model('stores', 'StoreStock')
+
+
+class OpeningPeriodFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = get_model('stores', 'OpeningPeriod')
+
+
+class StoreStatusFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = get_model('stores', 'StoreStatus')
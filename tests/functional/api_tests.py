@@ -0,0 +1,115 @@
+from datetime import time
+from unittest.mock import patch
+
+from django.db.models.query import QuerySet
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.timezone import localtime
+from oscar.test.testcases import WebTestCase
+
+from tests.factories import OpeningPeriodFactory, StoreAddressFactory, StoreFactory, StoreGroupFactory
+
+
+class TestStoreApi(WebTestCase):
+    anonymous = True
+
+    def setUp(self):
+        super().setUp()
+        self.group = StoreGroupFactory(name="North", slug='north')
+        self.main_store = StoreFactory(
+            name="Southbank", slug='southbank', location='POINT(144.917908 -37.815751)')
+        StoreAddressFactory(store=self.main_store, line1='1 River Street', postcode='3006')
+        OpeningPeriodFactory(
+            store=self.main_store, weekday=localtime().isoweekday(),
+            start=time(0, 0), end=time(23, 59, 59))
+        self.other_store = StoreFactory(
+            name="Northcote", slug='northcote', location='POINT(144.998401 -37.772895)',
+            group=self.group)
+        StoreFactory(name="Closed down", is_active=False)
+
+    def test_lists_every_active_store_by_name(self):
+        response = self.get(reverse('stores:api-list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        results = response.json['results']
+        self.assertEqual([store['name'] for store in results], ["Northcote", "Southbank"])
+
+        southbank = results[1]
+        self.assertEqual(southbank['id'], self.main_store.pk)
+        self.assertEqual(southbank['lat'], -37.815751)
+        self.assertEqual(southbank['lng'], 144.917908)
+        self.assertEqual(southbank['address_line1'], '1 River Street')
+        self.assertEqual(southbank['postcode'], '3006')
+        self.assertEqual(southbank['status'], 'open')
+        self.assertEqual(results[0]['group'], 'north')
+        self.assertEqual(results[0]['status'], 'closed')
+
+    def test_only_returns_the_selected_fields(self):
+        response = self.get(reverse('stores:api-list'), params={'fields': 'id,name'})
+        self.assertEqual(response.json['results'], [
+            {'id': self.other_store.pk, 'name': "Northcote"},
+            {'id': self.main_store.pk, 'name': "Southbank"},
+        ])
+
+    def test_rejects_unknown_fields(self):
+        response = self.get(reverse('stores:api-list'), params={'fields': 'id,secret'},
+                            status=400)
+        self.assertIn('secret', response.json['errors']['fields'][0])
+
+    def test_can_be_filtered(self):
+        response = self.get(reverse('stores:api-list'), params={'group': self.group.pk})
+        self.assertEqual([store['name'] for store in response.json['results']], ["Northcote"])
+
+        response = self.get(reverse('stores:api-list'), params={'open_now': 'on'})
+        self.assertEqual([store['name'] for store in response.json['results']], ["Southbank"])
+
+    def test_searches_nearest_first(self):
+        response = self.get(reverse('stores:api-search'), params={
+            'latitude': '-37.7736132', 'longitude': '144.9997396', 'fields': 'name'})
+        results = response.json['results']
+        self.assertEqual([store['name'] for store in results], ["Northcote", "Southbank"])
+        self.assertLess(results[0]['distance'], results[1]['distance'])
+
+    def test_search_needs_a_location(self):
+        self.get(reverse('stores:api-search'), status=400)
+
+    def test_returns_a_single_active_store(self):
+        response = self.get(reverse('stores:api-detail', kwargs={'pk': self.main_store.pk}),
+                            params={'fields': 'name,slug,status'})
+        self.assertEqual(response.json, {'name': "Southbank", 'slug': 'southbank', 'status': 'open'})
+
+    def test_inactive_stores_are_not_found(self):
+        closed = StoreFactory(name="Gone", is_active=False)
+        self.get(reverse('stores:api-detail', kwargs={'pk': closed.pk}), status=404)
+
+    @override_settings(STORES_API_CHUNK_SIZE=2)
+    def test_streams_rows_a_chunk_at_a_time(self):
+        for index in range(5):
+            StoreFactory(name="Branch %d" % index, location='POINT(144.9 -37.8)')
+
+        with patch.object(QuerySet, 'iterator', autospec=True,
+                          side_effect=QuerySet.iterator) as iterator:
+            response = self.get(reverse('stores:api-list'), params={'fields': 'id'})
+        self.assertIn(2, [call.kwargs.get('chunk_size') for call in iterator.call_args_list])
+        self.assertEqual(len(response.json['results']), 7)
+
+    def test_rows_are_read_while_the_response_streams(self):
+        response = self.client.get(reverse('stores:api-list'), {'fields': 'name'})
+        self.assertTrue(response.streaming)
+        # Nothing has been read yet, so a store added now is included
+        StoreFactory(name="Richmond", location='POINT(144.99 -37.82)')
+
+        parts = [part.decode() for part in response.streaming_content]
+        # The opening, one part per store, and the closing
+        self.assertEqual(len(parts), 5)
+        self.assertEqual(''.join(parts), '{"results":[{"name":"Northcote"},'
+                                         '{"name":"Richmond"},{"name":"Southbank"}]}')
+
+    @override_settings(STORES_NEAREST_LIMIT=1)
+    def test_search_is_capped_like_the_store_search(self):
+        params = {'latitude': '-37.7736132', 'longitude': '144.9997396', 'fields': 'name'}
+        response = self.get(reverse('stores:api-search'), params=params)
+        self.assertEqual([store['name'] for store in response.json['results']], ["Northcote"])
+
+        with self.settings(STORES_API_NEAREST_LIMIT=None):
+            response = self.get(reverse('stores:api-search'), params=params)
+        self.assertEqual(len(response.json['results']), 2)
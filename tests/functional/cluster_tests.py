@@ -0,0 +1,87 @@
+from django.core.cache import cache
+from django.urls import reverse
+from oscar.core.loading import get_model
+from oscar.test.testcases import WebTestCase
+
+from stores.cache import get_directory_version
+from stores.clusters import get_clusters
+from stores.tiles import tiles_for_bbox
+from tests.factories import StoreFactory, StoreGroupFactory, StoreStatusFactory
+
+Store = get_model('stores', 'Store')
+
+
+class TestStoreClusters(WebTestCase):
+    anonymous = True
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.southbank = StoreFactory(location='POINT(144.917908 -37.815751)')
+        self.northcote = StoreFactory(location='POINT(144.998401 -37.772895)')
+        self.sydney = StoreFactory(location='POINT(151.2093 -33.8688)')
+        StoreFactory(location='POINT(144.95 -37.80)', is_active=False)
+
+    def get_clusters(self, **params):
+        return self.get(reverse('stores:clusters'), params=params).json
+
+    def test_clusters_nearby_stores_at_low_zoom(self):
+        data = self.get_clusters(bbox='140,-40,155,-30', zoom=4)
+        clusters = sorted(data['clusters'], key=lambda cluster: cluster['count'])
+        self.assertEqual([cluster['count'] for cluster in clusters], [1, 2])
+        self.assertEqual(clusters[0]['pk'], self.sydney.pk)
+        self.assertNotIn('pk', clusters[1])
+
+    def test_separates_stores_at_high_zoom(self):
+        data = self.get_clusters(bbox='144.9,-37.82,145,-37.77', zoom=14)
+        self.assertEqual(sorted(cluster['pk'] for cluster in data['clusters']),
+                         sorted([self.southbank.pk, self.northcote.pk]))
+
+    def test_filters_by_group(self):
+        group = StoreGroupFactory(name="Sydney")
+        self.sydney.group = group
+        self.sydney.save()
+        data = self.get_clusters(bbox='140,-40,155,-30', zoom=4, group=group.pk)
+        self.assertEqual([cluster['pk'] for cluster in data['clusters']], [self.sydney.pk])
+
+    def test_store_changes_invalidate_cached_clusters(self):
+        self.get_clusters(bbox='140,-40,155,-30', zoom=4)
+        self.sydney.is_active = False
+        self.sydney.save()
+        data = self.get_clusters(bbox='140,-40,155,-30', zoom=4)
+        self.assertEqual([cluster['count'] for cluster in data['clusters']], [2])
+
+    def test_status_changes_keep_cached_clusters(self):
+        version = get_directory_version()
+        StoreStatusFactory(store=self.sydney, status='busy')
+        Store.objects.filter(pk=self.southbank.pk).set_status('closed')
+        self.sydney.refresh_from_db()
+        self.sydney.save()
+        self.assertEqual(get_directory_version(), version)
+
+        self.sydney.location = 'POINT(151.21 -33.87)'
+        self.sydney.save()
+        self.assertNotEqual(get_directory_version(), version)
+
+    def test_deleting_a_store_invalidates_cached_clusters(self):
+        version = get_directory_version()
+        self.sydney.delete()
+        self.assertNotEqual(get_directory_version(), version)
+
+    def test_clusters_every_tile_in_one_query(self):
+        tiles = tiles_for_bbox((140, -40, 155, -30), 6)
+        self.assertGreater(len(tiles), 1)
+        get_directory_version()
+        with self.assertNumQueries(1):
+            clusters = get_clusters(tiles, 6)
+        self.assertEqual(sorted(cluster['count'] for cluster in clusters), [1, 2])
+
+    def test_rejects_too_many_tiles(self):
+        response = self.get(reverse('stores:clusters'),
+                            params={'bbox': '-180,-85,180,85', 'zoom': 10}, status=400)
+        self.assertIn('__all__', response.json['errors'])
+
+    def test_rejects_an_invalid_bbox(self):
+        response = self.get(reverse('stores:clusters'),
+                            params={'bbox': '1,2,3', 'zoom': 4}, status=400)
+        self.assertIn('bbox', response.json['errors'])
@@ -1,7 +1,14 @@
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.cache import SessionStore
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from oscar.core.loading import get_model
 from oscar.test.testcases import WebTestCase
 
-from tests.factories import StoreAddressFactory, StoreFactory
+from stores.dashboard.views import change_branches_status
+from tests.factories import StoreAddressFactory, StoreFactory, VendorFactory
+
+StoreStatus = get_model('stores', 'StoreStatus')
 
 
 class TestDashboardStoreSearchForm(WebTestCase):
@@ -28,3 +35,44 @@ class TestDashboardStoreSearchForm(WebTestCase):
         self.assertEqual(resp.context['form'].cleaned_data, {'address': 'portland london',
                                                              'name': ''})
         self.assertEqual(list(resp.context['object_list']), [self.store1])
+
+
+class TestChangeBranchesStatus(TestCase):
+
+    def setUp(self):
+        self.vendor = VendorFactory()
+        location = 'POINT(144.917908 -37.815751)'
+        self.first = StoreFactory(name='first', vendor=self.vendor, location=location)
+        self.second = StoreFactory(name='second', vendor=self.vendor, location=location)
+        self.other = StoreFactory(name='other', vendor=VendorFactory(), location=location)
+
+    def post(self, data):
+        request = RequestFactory().post(reverse('stores-dashboard:change_branches_status'), data)
+        request.user = self.vendor.user
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        request._dont_enforce_csrf_checks = True
+        response = change_branches_status(request)
+        self.assertEqual(response.status_code, 302)
+        return [str(message) for message in request._messages]
+
+    def get_busy_stores(self):
+        return set(StoreStatus.objects.filter(status='busy').values_list('store__name', flat=True))
+
+    def test_sets_the_status_of_all_the_vendors_branches(self):
+        self.post({'status': 'busy', 'duration': '1_hour'})
+        self.assertEqual(self.get_busy_stores(), {'first', 'second'})
+
+    def test_sets_the_status_of_the_selected_branches(self):
+        self.post({'status': 'busy', 'store_ids': [self.second.pk, self.other.pk]})
+        self.assertEqual(self.get_busy_stores(), {'second'})
+
+    def test_rejects_an_invalid_status(self):
+        messages = self.post({'status': 'melted', 'store_ids': [self.first.pk]})
+        self.assertEqual(messages, ["Invalid status."])
+        self.assertFalse(StoreStatus.objects.exists())
+
+    def test_rejects_an_invalid_selection(self):
+        messages = self.post({'status': 'busy', 'store_ids': ['first']})
+        self.assertEqual(messages, ["Invalid branch selection."])
+        self.assertFalse(StoreStatus.objects.exists())
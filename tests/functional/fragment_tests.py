@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import translation
+from oscar.core.loading import get_model
+from oscar.test.testcases import WebTestCase
+
+from stores.fragments import get_fragment_cache_key, prefetch_fragments
+from tests.factories import StoreAddressFactory, StoreFactory
+
+Store = get_model('stores', 'Store')
+
+
+class TestStoreFragments(WebTestCase):
+    anonymous = True
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.store = StoreFactory(name="Southbank", email='southbank@example.com',
+                                  location='POINT(144.917908 -37.815751)')
+        StoreAddressFactory(store=self.store, line1='1 River Street')
+
+    def test_caches_store_cards_until_the_store_changes(self):
+        self.assertContains(self.get(reverse('stores:index')), 'southbank@example.com')
+
+        # Bulk updates don't send signals, so the cached card is still served
+        Store.objects.filter(pk=self.store.pk).update(email='river@example.com')
+        self.assertContains(self.get(reverse('stores:index')), 'southbank@example.com')
+
+        self.store.refresh_from_db()
+        self.store.save()
+        page = self.get(reverse('stores:index'))
+        self.assertContains(page, 'river@example.com')
+        self.assertNotContains(page, 'southbank@example.com')
+
+    def test_detail_page_is_rendered_from_the_cached_fragment(self):
+        url = self.store.get_absolute_url()
+        self.assertContains(self.get(url), '1 River Street')
+
+        Store.objects.filter(pk=self.store.pk).update(email='river@example.com')
+        self.assertContains(self.get(url), 'southbank@example.com')
+
+    def test_status_badge_is_rendered_outside_the_cached_fragment(self):
+        page = self.get(reverse('stores:index'))
+        self.assertContains(page, 'badge')
+
+        html = cache.get(get_fragment_cache_key(self.store, 'card'))
+        self.assertIn('1 River Street', html)
+        self.assertNotIn('badge', html)
+
+    def test_fragments_are_cached_per_language(self):
+        with translation.override('en'):
+            english_key = get_fragment_cache_key(self.store, 'card')
+        with translation.override('fr'):
+            french_key = get_fragment_cache_key(self.store, 'card')
+        self.assertNotEqual(english_key, french_key)
+
+    def test_page_of_cached_fragments_is_loaded_without_queries(self):
+        StoreFactory(name="Docklands", location='POINT(144.946457 -37.817692)')
+        prefetch_fragments(list(Store.objects.all()), 'card')
+
+        stores = list(Store.objects.all())
+        with self.assertNumQueries(0):
+            prefetch_fragments(stores, 'card')
+        self.assertTrue(all(store._fragments['card'] for store in stores))
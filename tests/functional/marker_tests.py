@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from oscar.test.testcases import WebTestCase
+
+from tests.factories import StoreFactory, StoreGroupFactory
+
+
+class TestStoreMarkers(WebTestCase):
+    anonymous = True
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.group = StoreGroupFactory(name="North")
+        self.store = StoreFactory(name="Southbank", location='POINT(144.917908 -37.815751)',
+                                  group=self.group)
+        StoreFactory(name="Closed down", is_active=False)
+
+    def test_lists_the_markers_of_active_stores(self):
+        response = self.get(reverse('stores:markers'))
+        self.assertEqual(response.json, [{
+            'id': self.store.pk,
+            'name': 'Southbank',
+            'lat': -37.815751,
+            'lng': 144.917908,
+            'group': 'North',
+            'url': self.store.get_absolute_url(),
+        }])
+
+    def test_answers_unchanged_payloads_with_not_modified(self):
+        etag = self.get(reverse('stores:markers'))['ETag']
+        self.get(reverse('stores:markers'), headers={'If-None-Match': etag}, status=304)
+
+        self.store.name = "Southbank Central"
+        self.store.save()
+
+        response = self.get(reverse('stores:markers'), headers={'If-None-Match': etag})
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json[0]['name'], "Southbank Central")
+
+    def test_store_list_links_to_active_stores(self):
+        page = self.get(reverse('stores:index'))
+        self.assertContains(page, self.store.get_absolute_url())
+        self.assertNotContains(page, "Closed down")
+
+    def test_store_list_leaves_the_directory_to_the_markers_endpoint(self):
+        with patch('stores.markers.build_markers') as build_markers:
+            page = self.get(reverse('stores:index'))
+        self.assertContains(page, 'data-markers-url="%s"' % reverse('stores:markers'))
+        build_markers.assert_not_called()
+
+    @override_settings(STORES_MARKERS_CACHE_TIMEOUT=600)
+    def test_caches_the_payload_with_a_timeout(self):
+        with patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.get(reverse('stores:index'))
+            self.get(reverse('stores:markers'))
+        timeouts = {call.kwargs['timeout'] for call in cache_set.call_args_list
+                    if call.args[0].startswith('store_markers_')}
+        self.assertEqual(timeouts, {600})
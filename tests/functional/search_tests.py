@@ -1,7 +1,16 @@
+from datetime import time
+
+from django.contrib.gis.measure import D
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.timezone import localtime
 from oscar.test.testcases import WebTestCase
 
-from tests.factories import StoreFactory, StoreGroupFactory
+from tests.factories import (
+    OpeningPeriodFactory, StoreAddressFactory, StoreFactory, StoreGroupFactory, StoreStatusFactory)
 
 
 class TestTheListOfStores(WebTestCase):
@@ -41,6 +50,56 @@ class TestTheListOfStores(WebTestCase):
         stores = page.context[0].get('object_list')
         self.assertSequenceEqual(stores, [self.other_store, self.main_store])
 
+    @override_settings(STORES_NEAREST_LIMIT=1)
+    def test_can_be_limited_to_the_nearest_stores(self):
+        page = self.get(reverse('stores:index'))
+        search_form = page.forms['store-search']
+        search_form['latitude'] = '-37.7736132'
+        search_form['longitude'] = '144.9997396'
+        page = search_form.submit()
+
+        stores = page.context[0].get('object_list')
+        self.assertSequenceEqual(stores, [self.other_store])
+
+    @override_settings(STORES_NEAREST_LIMIT=1)
+    def test_nearest_stores_are_ranked_in_metres(self):
+        # From Riyadh, 1 degree east is about 101km but 0.95 degrees north
+        # about 105km, so ranking by degrees would pick the wrong store
+        east = StoreFactory(name="East store", location='POINT(47.6753 24.7136)')
+        StoreFactory(name="North store", location='POINT(46.6753 25.6636)')
+
+        page = self.get(reverse('stores:index'))
+        search_form = page.forms['store-search']
+        search_form['latitude'] = '24.7136'
+        search_form['longitude'] = '46.6753'
+        page = search_form.submit()
+
+        stores = page.context[0].get('object_list')
+        self.assertSequenceEqual(stores, [east])
+
+    @override_settings(STORES_MAX_SEARCH_DISTANCE=D(km=5))
+    def test_can_be_limited_to_a_maximum_distance(self):
+        # Northcote is about 8.5km from Southbank
+        page = self.get(reverse('stores:index'))
+        search_form = page.forms['store-search']
+        search_form['latitude'] = '-37.815751'
+        search_form['longitude'] = '144.917908'
+        page = search_form.submit()
+
+        stores = page.context[0].get('object_list')
+        self.assertSequenceEqual(stores, [self.main_store])
+
+    @override_settings(STORES_MAX_SEARCH_DISTANCE=D(km=10))
+    def test_maximum_distance_includes_stores_within_it(self):
+        page = self.get(reverse('stores:index'))
+        search_form = page.forms['store-search']
+        search_form['latitude'] = '-37.815751'
+        search_form['longitude'] = '144.917908'
+        page = search_form.submit()
+
+        stores = page.context[0].get('object_list')
+        self.assertSequenceEqual(stores, [self.main_store, self.other_store])
+
     def test_can_be_filtered_by_store_group(self):
         north_group = StoreGroupFactory(name="North")
         south_group = StoreGroupFactory(name="South")
@@ -59,3 +118,73 @@ class TestTheListOfStores(WebTestCase):
 
         stores = page.context[0].get('object_list')
         self.assertSequenceEqual(stores, [self.main_store])
+
+    def test_can_be_filtered_to_stores_open_now(self):
+        for store in (self.main_store, self.other_store):
+            OpeningPeriodFactory(
+                store=store, weekday=localtime().isoweekday(),
+                start=time(0, 0), end=time(23, 59, 59))
+        StoreStatusFactory(store=self.other_store, status='busy')
+
+        page = self.get(reverse('stores:index'))
+        search_form = page.forms['store-search']
+        search_form['latitude'] = '-37.7736132'
+        search_form['longitude'] = '-144.9997396'
+        search_form['open_now'] = True
+        page = search_form.submit()
+
+        stores = page.context[0].get('object_list')
+        self.assertSequenceEqual(stores, [self.main_store])
+
+    @override_settings(STORES_PAGE_SIZE=1)
+    def test_pages_by_name_with_a_cursor(self):
+        page = self.get(reverse('stores:index'))
+        self.assertSequenceEqual(page.context[0].get('object_list'), [self.main_store])
+
+        page = page.click("More stores")
+        self.assertSequenceEqual(page.context[0].get('object_list'), [self.other_store])
+        self.assertIsNone(page.context[0].get('next_page_url'))
+
+    @override_settings(STORES_PAGE_SIZE=1)
+    def test_pages_by_distance_with_a_cursor(self):
+        params = {'query': '', 'latitude': '-37.7736132', 'longitude': '144.9997396'}
+        data = self.get(reverse('stores:index-page'), params=params).json
+        self.assertEqual([store['pk'] for store in data['results']], [self.other_store.pk])
+
+        params['cursor'] = data['next']
+        data = self.get(reverse('stores:index-page'), params=params).json
+        self.assertEqual([store['pk'] for store in data['results']], [self.main_store.pk])
+        self.assertIsNone(data['next'])
+
+    def test_invalid_cursors_are_not_found(self):
+        self.get(reverse('stores:index'), params={'cursor': 'nope'}, status=404)
+
+    def test_invalid_cursors_are_rejected_as_json(self):
+        response = self.get(reverse('stores:index-page'), params={'cursor': 'nope'}, status=400)
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertIn('cursor', response.json['errors'])
+
+
+class TestStoreListQueries(WebTestCase):
+    anonymous = True
+
+    def create_stores(self, count):
+        for __ in range(count):
+            store = StoreFactory(location='POINT(144.917908 -37.815751)')
+            StoreAddressFactory(store=store, line1='1 Main Street')
+            for weekday in (1, 2, 3):
+                OpeningPeriodFactory(store=store, weekday=weekday, start=time(9), end=time(17))
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.get(url)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_number_of_stores(self):
+        url = reverse('stores:index')
+        self.create_stores(2)
+        baseline = self.count_queries(url)
+
+        self.create_stores(8)
+        self.assertEqual(self.count_queries(url), baseline)
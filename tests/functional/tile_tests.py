@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.urls import reverse
+from oscar.test.testcases import WebTestCase
+
+from stores.models import Store
+from stores.tiles import lnglat_to_tile
+from stores.vector_tiles import get_tile_version_key
+from tests.factories import StoreFactory, StoreStatusFactory
+
+
+class TestStoreTiles(WebTestCase):
+    anonymous = True
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.store = StoreFactory(location='POINT(144.917908 -37.815751)')
+
+    def get_tile(self, zoom, lng, lat, **kwargs):
+        x, y = lnglat_to_tile(lng, lat, zoom)
+        return self.get(reverse('stores:tile', kwargs={'zoom': zoom, 'x': x, 'y': y}), **kwargs)
+
+    def test_renders_the_stores_in_a_tile(self):
+        response = self.get_tile(10, 144.917908, -37.815751)
+        self.assertEqual(response.content_type, 'application/vnd.mapbox-vector-tile')
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn(b'stores', response.body)
+        self.assertIn(b'group_slug', response.body)
+
+    def test_tiles_without_stores_are_empty(self):
+        self.assertEqual(self.get_tile(10, 151.2093, -33.8688).body, b'')
+
+    def test_moving_a_store_invalidates_both_tiles(self):
+        self.get_tile(10, 144.917908, -37.815751)
+        self.get_tile(10, 151.2093, -33.8688)
+
+        self.store.location = 'POINT(151.2093 -33.8688)'
+        self.store.save()
+
+        self.assertEqual(self.get_tile(10, 144.917908, -37.815751).body, b'')
+        self.assertIn(b'stores', self.get_tile(10, 151.2093, -33.8688).body)
+
+    def get_tile_version(self, zoom, lng, lat):
+        return cache.get(get_tile_version_key(zoom, *lnglat_to_tile(lng, lat, zoom)))
+
+    def test_status_changes_invalidate_the_store_tile(self):
+        self.get_tile(10, 144.917908, -37.815751)
+        version = self.get_tile_version(10, 144.917908, -37.815751)
+
+        status = StoreStatusFactory(store=self.store, status='busy')
+        self.assertNotEqual(self.get_tile_version(10, 144.917908, -37.815751), version)
+
+        version = self.get_tile_version(10, 144.917908, -37.815751)
+        status.delete()
+        self.assertNotEqual(self.get_tile_version(10, 144.917908, -37.815751), version)
+
+    def test_setting_statuses_in_bulk_invalidates_the_store_tiles(self):
+        self.get_tile(10, 144.917908, -37.815751)
+        version = self.get_tile_version(10, 144.917908, -37.815751)
+
+        Store.objects.filter(pk=self.store.pk).set_status('closed')
+        self.assertNotEqual(self.get_tile_version(10, 144.917908, -37.815751), version)
+
+    def test_tiles_outside_the_zoom_level_are_not_found(self):
+        self.get(reverse('stores:tile', kwargs={'zoom': 1, 'x': 2, 'y': 0}), status=404)
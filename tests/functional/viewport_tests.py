@@ -0,0 +1,56 @@
+from django.urls import reverse
+from oscar.test.testcases import WebTestCase
+
+from tests.factories import StoreFactory, StoreGroupFactory
+
+
+class TestViewportSearch(WebTestCase):
+    anonymous = True
+
+    def setUp(self):
+        super().setUp()
+        self.group = StoreGroupFactory(name="North")
+        self.centre = StoreFactory(location='POINT(145.0 -37.8)')
+        self.near = StoreFactory(location='POINT(145.01 -37.8)', group=self.group)
+        self.far = StoreFactory(location='POINT(145.05 -37.8)')
+        self.outside = StoreFactory(location='POINT(151.2093 -33.8688)')
+        StoreFactory(location='POINT(145.0 -37.8)', is_active=False)
+
+    def search(self, status=200, **params):
+        params.setdefault('bbox', '144.9,-37.9,145.1,-37.7')
+        return self.get(reverse('stores:viewport'), params=params, status=status).json
+
+    def test_returns_stores_in_the_viewport_nearest_to_its_centre_first(self):
+        data = self.search()
+        self.assertEqual([store['pk'] for store in data['results']],
+                         [self.centre.pk, self.near.pk, self.far.pk])
+        self.assertEqual(data['results'][0], {
+            'pk': self.centre.pk,
+            'name': self.centre.name,
+            'lat': -37.8,
+            'lng': 145.0,
+            'status': 'closed',
+        })
+        self.assertIsNone(data['next'])
+
+    def test_pages_with_a_cursor(self):
+        data = self.search(limit=2)
+        self.assertEqual([store['pk'] for store in data['results']],
+                         [self.centre.pk, self.near.pk])
+        data = self.search(limit=2, cursor=data['next'])
+        self.assertEqual([store['pk'] for store in data['results']], [self.far.pk])
+        self.assertIsNone(data['next'])
+
+    def test_filters_by_group(self):
+        data = self.search(group=self.group.pk)
+        self.assertEqual([store['pk'] for store in data['results']], [self.near.pk])
+
+    def test_viewport_across_the_antimeridian(self):
+        store = StoreFactory(location='POINT(-179.5 0)')
+        data = self.search(bbox='179,-1,-179,1')
+        self.assertEqual([store['pk'] for store in data['results']], [store.pk])
+
+    def test_rejects_invalid_parameters(self):
+        self.assertIn('bbox', self.search(bbox='', status=400)['errors'])
+        self.assertIn('cursor', self.search(cursor='nope', status=400)['errors'])
+        self.assertIn('group', self.search(group=0, status=400)['errors'])
@@ -0,0 +1,69 @@
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.test import SimpleTestCase, TestCase
+
+from stores.services.locator import StoreLocator, haversine
+from tests.factories import StoreFactory
+
+RIYADH = Point(46.6753, 24.7136, srid=4326)
+
+
+class TestStoreLocator(SimpleTestCase):
+
+    def setUp(self):
+        self.locator = StoreLocator()
+        self.locator.add(1, 46.68, 24.72, group_id=1)
+        self.locator.add(2, 46.80, 24.80, group_id=2)
+        self.locator.add(3, 39.17, 21.54, group_id=1)  # Jeddah
+        self.locator.add(4, -0.12, 51.50)  # London
+
+    def test_haversine(self):
+        # Riyadh to Jeddah is about 850km
+        self.assertAlmostEqual(haversine(46.6753, 24.7136, 39.1925, 21.4858) / 1000, 850, delta=10)
+
+    def test_nearest_orders_by_distance(self):
+        self.assertEqual([pk for pk, __ in self.locator.nearest(RIYADH, k=3)], [1, 2, 3])
+
+    def test_nearest_widens_the_search_until_it_finds_enough_stores(self):
+        self.assertEqual([pk for pk, __ in self.locator.nearest(RIYADH, k=10)], [1, 2, 3, 4])
+
+    def test_nearest_within_a_maximum_distance(self):
+        results = self.locator.nearest(RIYADH, k=3, max_distance=D(km=100))
+        self.assertEqual([pk for pk, __ in results], [1, 2])
+
+    def test_within(self):
+        results = self.locator.within(RIYADH, D(km=5))
+        self.assertEqual([pk for pk, __ in results], [1])
+        self.assertLess(results[0][1], 5000)
+
+    def test_filters_by_group(self):
+        self.assertEqual([pk for pk, __ in self.locator.nearest(RIYADH, k=2, group=1)], [1, 3])
+
+    def test_searches_across_the_antimeridian(self):
+        self.locator.add(5, 179.99, 0)
+        results = self.locator.within(Point(-179.99, 0), D(km=5))
+        self.assertEqual([pk for pk, __ in results], [5])
+
+    def test_moving_and_removing_stores(self):
+        self.locator.add(1, -0.13, 51.50)
+        self.assertEqual([pk for pk, __ in self.locator.nearest(RIYADH)], [2])
+        self.locator.remove(2)
+        self.locator.remove(2)
+        self.assertEqual(len(self.locator), 3)
+        self.assertEqual([pk for pk, __ in self.locator.nearest(RIYADH)], [3])
+
+
+class TestStoreLocatorQueryset(TestCase):
+
+    def test_builds_from_active_stores_and_preserves_order(self):
+        far = StoreFactory(location=Point(46.80, 24.80, srid=4326))
+        near = StoreFactory(location=Point(46.68, 24.72, srid=4326))
+        StoreFactory(location=Point(46.6753, 24.7136, srid=4326), is_active=False)
+
+        locator = StoreLocator()
+        locator.build()
+        self.assertEqual(len(locator), 2)
+
+        stores = locator.nearest_stores(RIYADH, k=2)
+        self.assertEqual(stores, [near, far])
+        self.assertLess(stores[0].distance.km, stores[1].distance.km)
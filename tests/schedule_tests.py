@@ -0,0 +1,127 @@
+from collections import namedtuple
+from datetime import datetime, time, timezone
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase
+
+from stores.schedule import SECONDS_PER_DAY, UTCSchedule, WeeklySchedule
+
+Period = namedtuple('Period', ['weekday', 'start', 'end'])
+
+# 2024-01-01 was a Monday
+MONDAY = datetime(2024, 1, 1)
+
+
+class TestWeeklySchedule(SimpleTestCase):
+
+    def test_is_open_within_a_period(self):
+        schedule = WeeklySchedule.from_periods([
+            Period(1, time(9), time(17)),
+        ])
+        self.assertTrue(schedule.is_open_at(MONDAY.replace(hour=9)))
+        self.assertTrue(schedule.is_open_at(MONDAY.replace(hour=17)))
+        self.assertFalse(schedule.is_open_at(MONDAY.replace(hour=17, second=1)))
+        self.assertFalse(schedule.is_open_at(MONDAY.replace(hour=8, minute=59)))
+        self.assertFalse(schedule.is_open_at(MONDAY.replace(day=2, hour=10)))
+
+    def test_missing_bounds_cover_the_whole_day(self):
+        schedule = WeeklySchedule.from_periods([
+            Period(2, None, time(12)),
+            Period(3, time(12), None),
+        ])
+        self.assertTrue(schedule.is_open_at(MONDAY.replace(day=2, hour=0)))
+        self.assertTrue(schedule.is_open_at(MONDAY.replace(day=3, hour=23, minute=59, second=59)))
+
+    def test_empty_period_is_closed(self):
+        schedule = WeeklySchedule.from_periods([Period(1, None, None)])
+        self.assertFalse(schedule)
+        self.assertFalse(schedule.is_open_at(MONDAY.replace(hour=12)))
+
+    def test_overlapping_periods_are_merged(self):
+        schedule = WeeklySchedule.from_periods([
+            Period(1, time(9), time(12)),
+            Period(1, time(11), time(14)),
+        ])
+        self.assertEqual(schedule.intervals, ((9 * 3600, 14 * 3600 + 1),))
+
+    def test_next_transition(self):
+        schedule = WeeklySchedule.from_periods([
+            Period(1, time(9), time(17)),
+            Period(5, time(10), time(12)),
+        ])
+        self.assertEqual(schedule.next_transition(MONDAY.replace(hour=8)),
+                         MONDAY.replace(hour=9))
+        self.assertEqual(schedule.next_transition(MONDAY.replace(hour=16)),
+                         MONDAY.replace(hour=17, second=1))
+        self.assertEqual(schedule.next_transition(MONDAY.replace(hour=18)),
+                         MONDAY.replace(day=5, hour=10))
+        # Sunday wraps round to next Monday
+        self.assertEqual(schedule.next_transition(MONDAY.replace(day=7)),
+                         MONDAY.replace(day=8, hour=9))
+
+    def test_never_open_has_no_transition(self):
+        self.assertIsNone(WeeklySchedule().next_transition(MONDAY))
+
+    def test_round_trips_through_its_intervals(self):
+        schedule = WeeklySchedule([(SECONDS_PER_DAY, SECONDS_PER_DAY + 60)])
+        self.assertEqual(WeeklySchedule(schedule.intervals), schedule)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class TestUTCSchedule(SimpleTestCase):
+    london = ZoneInfo('Europe/London')
+
+    def daily(self, start, end):
+        return WeeklySchedule.from_periods([Period(day, start, end) for day in range(1, 8)])
+
+    def test_spans_the_current_and_next_week(self):
+        schedule = UTCSchedule.from_weekly(
+            self.daily(time(9), time(17)), ZoneInfo('Asia/Riyadh'), utc(2024, 1, 3, 12))
+        self.assertEqual(schedule.valid_from, utc(2023, 12, 31, 21).timestamp())
+        self.assertEqual(schedule.valid_until, utc(2024, 1, 7, 21).timestamp())
+        self.assertTrue(schedule.covers(utc(2024, 1, 3, 12)))
+        self.assertFalse(schedule.covers(utc(2024, 1, 8)))
+        # 09:00 in Riyadh is 06:00 UTC
+        self.assertTrue(schedule.is_open_at(utc(2024, 1, 10, 6)))
+        self.assertFalse(schedule.is_open_at(utc(2024, 1, 10, 5, 59)))
+
+    def test_clocks_going_forward(self):
+        # British Summer Time started at 01:00 UTC on Sunday 31 March 2024
+        schedule = UTCSchedule.from_weekly(
+            self.daily(time(9), time(17)), self.london, utc(2024, 3, 27, 12))
+
+        self.assertFalse(schedule.is_open_at(utc(2024, 3, 30, 8, 30)))
+        self.assertTrue(schedule.is_open_at(utc(2024, 3, 30, 9)))
+        self.assertTrue(schedule.is_open_at(utc(2024, 3, 30, 16, 30)))
+
+        self.assertFalse(schedule.is_open_at(utc(2024, 3, 31, 7, 30)))
+        self.assertTrue(schedule.is_open_at(utc(2024, 3, 31, 8)))
+        self.assertFalse(schedule.is_open_at(utc(2024, 3, 31, 16, 30)))
+
+        self.assertEqual(schedule.next_transition(utc(2024, 3, 30, 18)), utc(2024, 3, 31, 8))
+
+    def test_clocks_going_back(self):
+        # British Summer Time ended at 01:00 UTC on Sunday 27 October 2024, so
+        # 01:00-03:00 local time lasted three hours
+        schedule = UTCSchedule.from_weekly(
+            WeeklySchedule.from_periods([Period(7, time(1), time(3))]),
+            self.london, utc(2024, 10, 23))
+
+        self.assertFalse(schedule.is_open_at(utc(2024, 10, 26, 23, 59)))
+        self.assertTrue(schedule.is_open_at(utc(2024, 10, 27, 0)))
+        self.assertTrue(schedule.is_open_at(utc(2024, 10, 27, 2, 30)))
+        self.assertEqual(schedule.next_transition(utc(2024, 10, 27, 1)), utc(2024, 10, 27, 3, 0, 1))
+
+    def test_transition_past_the_span_requires_a_rebuild(self):
+        schedule = UTCSchedule.from_weekly(
+            WeeklySchedule.from_periods([Period(1, time(9), time(17))]),
+            ZoneInfo('UTC'), utc(2024, 1, 3))
+        # Next opening is on 8 January, when the schedule must be rebuilt
+        self.assertEqual(schedule.next_transition(utc(2024, 1, 1, 18)), utc(2024, 1, 8))
+
+    def test_never_open_has_no_transition(self):
+        schedule = UTCSchedule.from_weekly(WeeklySchedule(), self.london, utc(2024, 1, 3))
+        self.assertIsNone(schedule.next_transition(utc(2024, 1, 3)))
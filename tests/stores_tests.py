@@ -1,11 +1,24 @@
+from datetime import datetime, time, timedelta, timezone
+from io import StringIO
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils.timezone import localtime, now
 from django_webtest import WebTest
 from oscar.test.factories import CountryFactory
 
 from stores.models import Store
-from tests.factories import StoreFactory
+from stores.services.geocode import BaseGeoCodeService, Point, ZeroResuls
+from stores.services.service_areas import ServiceAreaIndex
+from stores.status import prefetch_current_status
+from stores.utils import get_status_cache_timeout
+from tests.factories import (
+    OpeningPeriodFactory, StoreAddressFactory, StoreFactory, StoreStatusFactory)
 
 
 class TestStore(TestCase):
@@ -25,6 +38,252 @@ class TestStore(TestCase):
         self.assertIn(store4, stores)
 
 
+class TestStoreStatus(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.store = StoreFactory(name='Open store', location='POINT(144.917908 -37.815751)')
+        OpeningPeriodFactory(
+            store=self.store, weekday=localtime().isoweekday(),
+            start=time(0, 0), end=time(23, 59, 59))
+
+    def test_annotated_status_without_an_active_status(self):
+        store = Store.objects.with_current_status().get(pk=self.store.pk)
+        self.assertTrue(store.within_opening_hours)
+        self.assertEqual(store.current_status, 'open')
+        self.assertTrue(store.is_open)
+
+    def test_annotated_status_matches_the_instance_status(self):
+        StoreStatusFactory(store=self.store, status='busy', duration=timedelta(hours=1))
+
+        store = Store.objects.with_current_status().get(pk=self.store.pk)
+        self.assertEqual(store.current_status, 'busy')
+        self.assertEqual(store.status_info['status'], self.store.status_info['status'])
+        self.assertLessEqual(store.status_info['remaining_time'], timedelta(hours=1))
+
+    def test_annotating_many_stores_uses_a_single_query(self):
+        for __ in range(5):
+            StoreFactory(location='POINT(144.917908 -37.815751)')
+        with self.assertNumQueries(1):
+            statuses = [store.status_info for store in Store.objects.with_current_status()]
+        self.assertEqual(len(statuses), 6)
+
+    def test_opening_hours_are_in_the_store_time_zone(self):
+        time_zone = 'Pacific/Kiritimati'
+        store = StoreFactory(name='Kiribati store', time_zone=time_zone,
+                             location='POINT(-157.36 1.87)')
+        OpeningPeriodFactory(
+            store=store, weekday=localtime(timezone=ZoneInfo(time_zone)).isoweekday(),
+            start=time(0, 0), end=time(23, 59, 59))
+
+        self.assertTrue(store.is_open)
+        annotated = Store.objects.with_current_status().get(pk=store.pk)
+        self.assertTrue(annotated.within_opening_hours)
+
+    def test_changing_related_data_invalidates_the_cached_status(self):
+        self.assertTrue(self.store.is_open)
+
+        StoreStatusFactory(store=self.store, status='closed', duration=timedelta(hours=1))
+        self.assertFalse(Store.objects.get(pk=self.store.pk).is_open)
+
+        self.store.statuses.all().delete()
+        self.assertTrue(Store.objects.get(pk=self.store.pk).is_open)
+
+        self.store.opening_periods.all().delete()
+        self.assertFalse(Store.objects.get(pk=self.store.pk).is_open)
+
+    def test_setting_the_status_of_many_stores_at_once(self):
+        other_store = StoreFactory(name='Other store', location='POINT(144.998401 -37.772895)')
+        OpeningPeriodFactory(
+            store=other_store, weekday=localtime().isoweekday(),
+            start=time(0, 0), end=time(23, 59, 59))
+        self.assertTrue(self.store.is_open)
+
+        with self.assertNumQueries(2):
+            statuses = Store.objects.all().set_status('busy', timedelta(hours=1))
+
+        self.assertEqual(len(statuses), 2)
+        for store in Store.objects.all():
+            self.assertEqual(store.status_info['status'], 'Busy')
+            self.assertEqual(store.statuses.get().expires_at - store.statuses.get().set_at,
+                             timedelta(hours=1))
+
+    def test_prefetching_status_for_a_page_of_stores(self):
+        StoreFactory(name='Shut store', location='POINT(144.917908 -37.815751)')
+
+        stores = list(Store.objects.all())
+        with self.assertNumQueries(2):
+            prefetch_current_status(stores)
+        with self.assertNumQueries(0):
+            self.assertEqual([store.is_open for store in stores], [True, False])
+
+        # Second time round every status comes from the cache
+        stores = list(Store.objects.all())
+        with self.assertNumQueries(0):
+            prefetch_current_status(stores)
+            self.assertEqual([store.is_open for store in stores], [True, False])
+
+    def test_prefetching_status_reuses_prefetched_opening_periods(self):
+        stores = list(Store.objects.prefetch_related('opening_periods'))
+        with self.assertNumQueries(1):
+            prefetch_current_status(stores)
+        self.assertTrue(stores[0].is_open)
+
+
+class TestStatusCacheTimeout(TestCase):
+    # 2024-01-01 was a Monday
+    closing_time = datetime(2024, 1, 1, 17, 0, 1, tzinfo=timezone.utc)
+
+    def setUp(self):
+        cache.clear()
+        self.store = StoreFactory(name='Day store', time_zone='UTC',
+                                  location='POINT(144.917908 -37.815751)')
+        OpeningPeriodFactory(store=self.store, weekday=1, start=time(9), end=time(17))
+
+    def test_timeout_lasts_until_the_status_can_change(self):
+        moment = self.closing_time - timedelta(minutes=30)
+        self.assertEqual(get_status_cache_timeout(moment, self.closing_time), 30 * 60)
+        self.assertEqual(get_status_cache_timeout(moment, moment - timedelta(seconds=5)), 1)
+
+    @override_settings(STORES_STATUS_CACHE_MAX_TIMEOUT=600)
+    def test_timeout_is_capped(self):
+        moment = self.closing_time - timedelta(hours=2)
+        self.assertEqual(get_status_cache_timeout(moment, self.closing_time), 600)
+        self.assertEqual(get_status_cache_timeout(moment, None), 600)
+
+    def test_status_is_cached_until_closing_time(self):
+        moment = self.closing_time - timedelta(minutes=1)
+        _status, _expires_at, valid_until = self.store._resolve_current_status(moment)
+        self.assertEqual(valid_until, self.closing_time)
+
+        with patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.assertEqual(self.store._get_cached_status(moment), ('Open', None))
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], 60)
+
+    @override_settings(STORES_STATUS_CACHE_MAX_TIMEOUT=600)
+    def test_status_is_cached_until_an_active_status_expires(self):
+        moment = self.closing_time - timedelta(hours=2)
+        StoreStatusFactory(store=self.store, status='busy', set_at=moment - timedelta(minutes=5),
+                           duration=timedelta(minutes=10))
+        _status, expires_at, valid_until = self.store._resolve_current_status(moment)
+        self.assertEqual(valid_until, expires_at)
+        self.assertEqual(get_status_cache_timeout(moment, valid_until), 5 * 60)
+
+    @override_settings(STORES_STATUS_CACHE_MAX_TIMEOUT=600)
+    def test_compiled_schedule_is_cached_with_a_timeout(self):
+        with patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            Store.objects.get(pk=self.store.pk).get_weekly_schedule()
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], 600)
+
+    def test_status_cached_before_closing_is_not_served_afterwards(self):
+        before = self.closing_time - timedelta(minutes=1)
+        self.assertEqual(self.store._get_cached_status(before), ('Open', None))
+
+        # The cache entry expires at closing time, when the store is closed
+        after = self.closing_time + timedelta(seconds=1)
+        with patch('time.time', return_value=after.timestamp() - before.timestamp()
+                   + datetime.now(timezone.utc).timestamp()):
+            self.assertEqual(self.store._get_cached_status(after), ('Closed', None))
+
+
+class TestServiceAreas(TestCase):
+    area = 'MULTIPOLYGON(((144.8 -37.9, 145.1 -37.9, 145.1 -37.7, 144.8 -37.7, 144.8 -37.9)))'
+    point = Point(144.95, -37.8, srid=4326)
+
+    def setUp(self):
+        self.near = StoreFactory(location='POINT(144.96 -37.8)', service_area=self.area)
+        self.far = StoreFactory(location='POINT(145.05 -37.8)', service_area=self.area)
+        StoreFactory(location='POINT(144.95 -37.8)')
+        StoreFactory(location='POINT(144.95 -37.8)', service_area=self.area, is_active=False)
+        StoreFactory(location='POINT(151.2 -33.8)',
+                     service_area='MULTIPOLYGON(((151 -34, 151.5 -34, 151.5 -33.5, 151 -33.5, 151 -34)))')
+
+    def test_stores_serving_a_point_nearest_first(self):
+        self.assertEqual(list(Store.objects.serving(self.point)), [self.near, self.far])
+
+    def test_combines_with_open_now(self):
+        for weekday in range(1, 8):
+            OpeningPeriodFactory(store=self.far, weekday=weekday, start=None, end=time(23, 59, 59))
+        self.assertEqual(list(Store.objects.serving(self.point).open_now()), [self.far])
+
+    def test_prepared_index(self):
+        index = ServiceAreaIndex()
+        index.build()
+        self.assertEqual(len(index), 3)
+        self.assertEqual([pk for pk, __ in index.serving(self.point)], [self.near.pk, self.far.pk])
+        self.assertEqual(index.serving(Point(140, -30, srid=4326)), [])
+
+        self.near.service_area = None
+        index.update_store(self.near)
+        self.assertEqual([pk for pk, __ in index.serving(self.point)], [self.far.pk])
+
+
+class TestPruneStoreStatuses(TestCase):
+
+    def test_deletes_statuses_past_the_retention_window(self):
+        store = StoreFactory(location='POINT(144.917908 -37.815751)')
+        StoreStatusFactory(store=store, status='busy', duration=timedelta(hours=1),
+                           set_at=now() - timedelta(days=40))
+        recent = StoreStatusFactory(store=store, status='busy', duration=timedelta(hours=1),
+                                    set_at=now() - timedelta(days=2))
+
+        call_command('prune_store_statuses', days=30, batch_size=1, stdout=StringIO())
+
+        self.assertEqual(list(store.statuses.all()), [recent])
+
+
+class FakeGeoCodeService(BaseGeoCodeService):
+    queries = []
+
+    def geocode(self, query):
+        self.queries.append(query)
+        if 'nowhere' in query:
+            raise ZeroResuls('ZERO_RESULTS')
+        return Point(144.917908, -37.815751)
+
+
+class TestGeocodeStores(TestCase):
+    backend = 'tests.stores_tests.FakeGeoCodeService'
+
+    def setUp(self):
+        FakeGeoCodeService.queries = []
+
+    def create_store(self, line1, **kwargs):
+        store = StoreFactory(**kwargs)
+        StoreAddressFactory(store=store, line1=line1)
+        return store
+
+    def test_geocodes_stores_at_the_default_location(self):
+        first = self.create_store('1 Main Street')
+        second = self.create_store('1 MAIN STREET.')
+        lost = self.create_store('nowhere')
+        placed = self.create_store('2 Main Street', location='POINT(10 10)')
+
+        call_command('geocode_stores', backend=self.backend, chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(len(FakeGeoCodeService.queries), 2)
+        first.refresh_from_db()
+        self.assertEqual(FakeGeoCodeService.queries[0], first.address.summary)
+        for store in (first, second):
+            store.refresh_from_db()
+            self.assertEqual(store.location.x, 144.917908)
+        lost.refresh_from_db()
+        self.assertEqual(lost.location.x, 46.6753)
+        placed.refresh_from_db()
+        self.assertEqual(placed.location.x, 10)
+
+    def test_resumes_after_a_primary_key(self):
+        first = self.create_store('1 Main Street')
+        second = self.create_store('2 Main Street')
+
+        call_command('geocode_stores', backend=self.backend, after_pk=first.pk, stdout=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.location.x, 46.6753)
+        self.assertEqual(second.location.x, 144.917908)
+
+
 def repr_opening_hours(store):
     r = {}
     for period in store.opening_periods.all().order_by('start'):
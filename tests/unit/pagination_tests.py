@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from django.db.models import Q
+
+from stores.pagination import (
+    InvalidCursor, decode_cursor, decode_keyset_cursor, encode_cursor, keyset_filter)
+
+
+class CursorTest(TestCase):
+
+    def test_round_trips_values(self):
+        values = [1234.5678901234567, 42]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+
+    def test_rejects_invalid_cursors(self):
+        for cursor in ['not a cursor', encode_cursor({'a': 1})]:
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_decodes_keyset_cursors(self):
+        self.assertEqual(decode_keyset_cursor(encode_cursor([10.5, 3]), (int, float)), [10.5, 3])
+        for cursor in ['not a cursor', encode_cursor([10.5]), encode_cursor(['a', 3]),
+                       encode_cursor([10.5, 'b'])]:
+            with self.assertRaises(InvalidCursor):
+                decode_keyset_cursor(cursor, (int, float))
+
+    def test_keyset_filter(self):
+        self.assertEqual(
+            keyset_filter(['distance', 'pk'], [10.5, 3]),
+            Q(distance=10.5, pk__gt=3) | Q(distance__gt=10.5))
@@ -1,7 +1,22 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.test import TestCase as DjangoTestCase
+from django.test import override_settings
 
 from stores.services import geocode
+from stores.services.gazetteer import Gazetteer, get_csv_places
 
 
 class GeoCodeTest(TestCase):
@@ -28,3 +43,282 @@ class GeoCodeTest(TestCase):
             func = geocode.GeoCodeService().geocode
             error = geocode.ZeroResuls
             self.assertRaises(error, func, 'query')
+
+
+class StubGeoCodeService(geocode.BaseGeoCodeService):
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    def geocode(self, query):
+        self.queries.append(query)
+        key = geocode.normalize_query(query)
+        if key not in self.results:
+            raise geocode.ZeroResuls('ZERO_RESULTS')
+        return geocode.Point(*self.results[key])
+
+
+class CachedGeoCodeTest(DjangoTestCase):
+    def setUp(self):
+        cache.clear()
+        self.stub = StubGeoCodeService({'riyadh 12345': (46.6753, 24.7136)})
+        self.service = geocode.CachedGeoCodeService(self.stub, maxsize=2)
+
+    def test_normalize_query(self):
+        self.assertEqual(geocode.normalize_query('  Riyadh,\t12345. '), 'riyadh 12345')
+        self.assertEqual(geocode.normalize_query('KING_FAHD Rd'), 'king fahd rd')
+
+    def test_equivalent_queries_share_a_result(self):
+        point = self.service.geocode('Riyadh, 12345')
+        self.assertEqual((point.x, point.y), (46.6753, 24.7136))
+        self.service.geocode('RIYADH 12345!')
+        self.assertEqual(self.stub.queries, ['Riyadh, 12345'])
+        self.assertEqual(self.service.stats, {'misses': 1, 'memory_hits': 1})
+
+    def test_sends_the_original_query_upstream(self):
+        self.assertRaises(geocode.ZeroResuls, self.service.geocode, 'Building #12-4, Olaya St.')
+        self.assertEqual(self.stub.queries, ['Building #12-4, Olaya St.'])
+        self.assertIn('building 12 4 olaya st', self.service._lru)
+
+    def test_shares_results_through_the_django_cache(self):
+        self.service.geocode('riyadh 12345')
+        other = geocode.CachedGeoCodeService(self.stub)
+        other.geocode('riyadh 12345')
+        self.assertEqual(len(self.stub.queries), 1)
+        self.assertEqual(other.stats, {'cache_hits': 1})
+
+    def test_caches_queries_without_results(self):
+        for __ in range(2):
+            self.assertRaises(geocode.ZeroResuls, self.service.geocode, 'nowhere')
+        self.assertEqual(self.stub.queries, ['nowhere'])
+
+    @override_settings(STORES_GEOCODE_NEGATIVE_CACHE_TIMEOUT=0)
+    def test_negative_results_have_their_own_timeout(self):
+        for __ in range(2):
+            self.assertRaises(geocode.ZeroResuls, self.service.geocode, 'nowhere')
+        self.assertEqual(self.stub.queries, ['nowhere', 'nowhere'])
+
+    def test_evicts_the_least_recently_used_query(self):
+        self.stub.results.update({'a': (1, 1), 'b': (2, 2)})
+        for query in ['riyadh 12345', 'a', 'riyadh 12345', 'b']:
+            self.service.geocode(query)
+        self.assertEqual(list(self.service._lru), ['riyadh 12345', 'b'])
+
+    @override_settings(STORES_GEOCODE_DB_CACHE=True)
+    def test_stores_results_in_the_database(self):
+        self.service.geocode('Riyadh 12345')
+        self.assertRaises(geocode.ZeroResuls, self.service.geocode, 'nowhere')
+        cache.clear()
+
+        other = geocode.CachedGeoCodeService(self.stub)
+        other.geocode('riyadh 12345')
+        self.assertRaises(geocode.ZeroResuls, other.geocode, 'nowhere')
+        self.assertEqual(len(self.stub.queries), 2)
+        self.assertEqual(other.stats, {'db_hits': 2})
+
+    def test_other_errors_are_not_cached(self):
+        self.stub.geocode = Mock(side_effect=geocode.OverQueryLimit)
+        self.assertRaises(geocode.OverQueryLimit, self.service.geocode, 'riyadh')
+        self.assertRaises(geocode.OverQueryLimit, self.service.geocode, 'riyadh')
+        self.assertEqual(self.stub.geocode.call_count, 2)
+
+    @override_settings(STORES_GEOCODE_DB_CACHE=True)
+    def test_ageocode_only_sends_the_request_off_thread(self):
+        threads = {}
+        get_stored = self.service._get_stored
+        geocode_upstream = self.stub.geocode
+
+        def record(name, func):
+            def wrapper(*args):
+                threads[name] = threading.get_ident()
+                return func(*args)
+            return wrapper
+
+        self.service._get_stored = record('cache', get_stored)
+        self.stub.geocode = record('upstream', geocode_upstream)
+
+        point = async_to_sync(self.service.ageocode)('Riyadh 12345')
+        self.assertEqual((point.x, point.y), (46.6753, 24.7136))
+        self.assertEqual(threads['cache'], threading.get_ident())
+        self.assertNotEqual(threads['upstream'], threading.get_ident())
+
+        cache.clear()
+        self.service.clear()
+        async_to_sync(self.service.ageocode)('riyadh 12345')
+        self.assertEqual(self.service.stats, {'db_hits': 1})
+
+
+class StubGeoCodeHandler(BaseHTTPRequestHandler):
+    """
+    Answers like Google's geocoding API, according to the address queried
+    """
+    over_query_limit = 0
+
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query)['address'][0]
+        if address == 'slow':
+            time.sleep(1)
+
+        if address == 'busy' and StubGeoCodeHandler.over_query_limit:
+            StubGeoCodeHandler.over_query_limit -= 1
+            data = {'status': 'OVER_QUERY_LIMIT', 'results': []}
+        elif address in ('riyadh', 'busy', 'slow'):
+            data = {'status': 'OK', 'results': [
+                {'geometry': {'location': {'lng': 46.6753, 'lat': 24.7136}}}]}
+        else:
+            data = {'status': 'ZERO_RESULTS', 'results': []}
+
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class GeoCodeServerTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeoCodeHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings = override_settings(
+            GOOGLE_MAPS_API_KEY='key',
+            STORES_GEOCODE_URL='http://127.0.0.1:%d/geocode/json' % cls.server.server_port,
+            STORES_GEOCODE_BACKOFF=0,
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_geocode(self):
+        point = geocode.GeoCodeService().geocode('riyadh')
+        self.assertEqual((point.x, point.y), (46.6753, 24.7136))
+
+    def test_zero_results(self):
+        self.assertRaises(geocode.ZeroResuls, geocode.GeoCodeService().geocode, 'nowhere')
+
+    def test_retries_over_query_limit(self):
+        StubGeoCodeHandler.over_query_limit = 2
+        point = geocode.GeoCodeService().geocode('busy')
+        self.assertEqual(point.x, 46.6753)
+        self.assertEqual(StubGeoCodeHandler.over_query_limit, 0)
+
+    @override_settings(STORES_GEOCODE_RETRIES=1)
+    def test_gives_up_after_the_retries(self):
+        StubGeoCodeHandler.over_query_limit = 2
+        self.assertRaises(geocode.OverQueryLimit, geocode.GeoCodeService().geocode, 'busy')
+        StubGeoCodeHandler.over_query_limit = 0
+
+    @override_settings(STORES_GEOCODE_TIMEOUT=(1, 0.1))
+    def test_times_out(self):
+        self.assertRaises(geocode.ConnectionFailed, geocode.GeoCodeService().geocode, 'slow')
+
+    def test_ageocode(self):
+        point = async_to_sync(geocode.GeoCodeService().ageocode)('riyadh')
+        self.assertEqual(point.y, 24.7136)
+
+    def test_concurrent_ageocode_calls_run_in_parallel(self):
+        # Both lookups have to be in flight at once to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        class BlockingGeoCodeService(geocode.BaseGeoCodeService):
+            def geocode(self, query):
+                barrier.wait()
+                return geocode.Point(0, 0)
+
+        service = BlockingGeoCodeService()
+
+        async def geocode_both():
+            return await asyncio.gather(service.ageocode('a'), service.ageocode('b'))
+
+        self.assertEqual(len(async_to_sync(geocode_both)()), 2)
+
+
+class GazetteerTest(TestCase):
+    def setUp(self):
+        self.gazetteer = Gazetteer([
+            ('riyadh', (46.6753, 24.7136)),
+            ('jeddah', (39.1925, 21.4858)),
+            ('al khobar', (50.2083, 26.2172)),
+            ('al kharj', (47.3, 24.15)),
+        ])
+
+    def test_exact_match(self):
+        self.assertEqual(self.gazetteer.lookup('jeddah'), (39.1925, 21.4858))
+
+    def test_place_followed_by_a_region(self):
+        self.assertEqual(self.gazetteer.lookup('riyadh saudi arabia'), (46.6753, 24.7136))
+        self.assertEqual(self.gazetteer.lookup('al khobar ksa'), (50.2083, 26.2172))
+        self.assertIsNone(self.gazetteer.lookup('riyadh najd'))
+
+    def test_street_addresses_are_not_resolved(self):
+        self.assertIsNone(self.gazetteer.lookup('riyadh olaya street 12'))
+        self.assertIsNone(self.gazetteer.lookup('12 king fahd road jeddah'))
+        self.assertIsNone(self.gazetteer.lookup('al khobar corniche saudi arabia'))
+
+    def test_unambiguous_prefix(self):
+        self.assertEqual(self.gazetteer.lookup('jed'), (39.1925, 21.4858))
+        self.assertIsNone(self.gazetteer.lookup('al'))
+        self.assertIsNone(self.gazetteer.lookup('al kh'))
+
+    def test_short_prefixes_are_not_resolved(self):
+        self.assertIsNone(self.gazetteer.lookup('r'))
+        self.assertIsNone(self.gazetteer.lookup('ri'))
+        self.assertEqual(self.gazetteer.lookup('riy'), (46.6753, 24.7136))
+
+    def test_similar_spelling(self):
+        self.assertEqual(self.gazetteer.lookup('jedah'), (39.1925, 21.4858))
+        self.assertIsNone(self.gazetteer.lookup('dammam'))
+        self.assertIsNone(self.gazetteer.lookup('jedah street'))
+
+    def test_loads_places_from_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,longitude,latitude\n12345,46.7,24.6\n')
+        self.addCleanup(os.remove, f.name)
+        self.assertEqual(list(get_csv_places(f.name, geocode.normalize_query)),
+                         [('12345', (46.7, 24.6))])
+
+
+class LocalGeoCodeTest(TestCase):
+    def setUp(self):
+        self.fallback = Mock()
+        self.service = geocode.LocalGeoCodeService(fallback=self.fallback)
+        gazetteer = Gazetteer([('riyadh', (46.6753, 24.7136))])
+        patcher = patch.object(geocode.LocalGeoCodeService, 'get_gazetteer', return_value=gazetteer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resolves_known_places_locally(self):
+        point = self.service.geocode('Riyadh, Saudi Arabia')
+        self.assertEqual((point.x, point.y), (46.6753, 24.7136))
+        self.fallback.geocode.assert_not_called()
+
+    def test_falls_back_on_a_miss(self):
+        self.service.geocode('King Fahd Road')
+        self.fallback.geocode.assert_called_once_with('King Fahd Road')
+
+    def test_passes_street_addresses_on(self):
+        self.service.geocode('Riyadh, Olaya Street 12')
+        self.fallback.geocode.assert_called_once_with('Riyadh, Olaya Street 12')
+
+    def test_without_a_fallback(self):
+        self.service.fallback = None
+        self.assertRaises(geocode.ZeroResuls, self.service.geocode, 'King Fahd Road')
+
+    def test_ageocode_awaits_the_fallback_on_a_miss(self):
+        self.fallback.ageocode = AsyncMock(return_value=geocode.Point(0, 0))
+        point = async_to_sync(self.service.ageocode)('Riyadh')
+        self.assertEqual((point.x, point.y), (46.6753, 24.7136))
+        async_to_sync(self.service.ageocode)('King Fahd Road')
+        self.fallback.ageocode.assert_awaited_once_with('King Fahd Road')
+        self.fallback.geocode.assert_not_called()
@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from stores.tiles import (
+    ORIGIN, lnglat_to_tile, tile_bounds, tile_lnglat_bounds, tiles_for_bbox)
+
+
+class TileTest(TestCase):
+
+    def test_lnglat_to_tile(self):
+        self.assertEqual(lnglat_to_tile(0, 0, 0), (0, 0))
+        self.assertEqual(lnglat_to_tile(-0.1276, 51.5072, 10), (511, 340))
+        # Points past the edges of the map are clamped to it
+        self.assertEqual(lnglat_to_tile(180, -90, 2), (3, 3))
+
+    def test_tile_bounds(self):
+        self.assertEqual(tile_bounds(0, 0, 0), (-ORIGIN, -ORIGIN, ORIGIN, ORIGIN))
+        self.assertEqual(tile_bounds(1, 1, 0), (0, 0, ORIGIN, ORIGIN))
+
+    def test_tile_lnglat_bounds(self):
+        min_lng, min_lat, max_lng, max_lat = tile_lnglat_bounds(1, 0, 1)
+        self.assertEqual((min_lng, max_lng, max_lat), (-180, 0, 0))
+        self.assertAlmostEqual(min_lat, -85.0511287798066)
+
+    def test_tiles_for_bbox(self):
+        self.assertEqual(tiles_for_bbox((-10, -10, 10, 10), 1),
+                         [(0, 0), (0, 1), (1, 0), (1, 1)])
+        self.assertEqual(tiles_for_bbox((10, 10, 20, 20), 1), [(1, 0)])
+
+    def test_tiles_for_bbox_across_the_antimeridian(self):
+        self.assertEqual(tiles_for_bbox((170, 10, -170, 20), 2), [(3, 1), (0, 1)])